@@ -0,0 +1,196 @@
+# backend/batch.py
+"""Batch valuation of whole inventories (dealer lots, fleet exports).
+
+Search terms are deduplicated after normalization and valued by a fixed pool of
+workers. The per-upstream rate limits in upstream.py pace the OpenAI and Google
+calls. Finished rows are appended to an NDJSON checkpoint as they complete, so
+an interrupted batch resumes where it stopped. The server deletes a checkpoint
+once its batch has finished cleanly, and ignores one older than the result
+cache's TTL, whose valuations and image URLs would be stale.
+
+CLI:
+    python batch.py inventory.csv -o results.ndjson [--concurrency 8]
+"""
+import os
+import io
+import re
+import csv
+import sys
+import json
+import asyncio
+import time
+import logging
+import hashlib
+import argparse
+
+import cache
+import upstream
+import pipeline
+import telemetry
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_TERMS = int(os.getenv("BATCH_MAX_TERMS", "10000"))
+BATCH_CHECKPOINT_DIR = os.getenv("BATCH_CHECKPOINT_DIR", "batch_checkpoints")
+
+log = logging.getLogger(__name__)
+
+# Header names of a search-term column, compared without case, spaces or punctuation
+TERM_COLUMNS = ("searchterm", "query", "vehicle", "term")
+
+
+def read_terms(text: str) -> list:
+    """Extracts search terms from CSV text.
+
+    Uses a searchTerm/query/vehicle/term column, or year+make+model columns,
+    if the header has them. A single-column CSV without such a header is a
+    plain list of terms. Raises ValueError for any other header, rather than
+    guessing which column holds the vehicles.
+    """
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [re.sub(r"[^a-z0-9]", "", cell.lower()) for cell in rows[0]]
+    for name in TERM_COLUMNS:
+        if name in header:
+            col = header.index(name)
+            return [row[col] for row in rows[1:] if col < len(row)]
+    if {"year", "make", "model"} <= set(header):
+        cols = [header.index(name) for name in ("year", "make", "model")]
+        return [" ".join(row[c] for c in cols if c < len(row)) for row in rows[1:]]
+    if all(len(row) == 1 for row in rows):
+        return [row[0] for row in rows]
+    raise ValueError(
+        "Could not find the vehicles in the CSV. Name their column searchTerm, query, "
+        "vehicle or term, or give year, make and model columns."
+    )
+
+
+def dedupe(terms) -> list:
+    """Drops blank terms and repeats that normalize the same, keeping the first spelling."""
+    seen = {}
+    for term in terms:
+        key = pipeline.normalize_term(term)
+        if key and key not in seen:
+            seen[key] = term.strip()
+    return list(seen.values())
+
+
+def batch_id(terms) -> str:
+    """Stable id for a set of terms, so re-posting the same list resumes it."""
+    keys = sorted(pipeline.normalize_term(term) for term in terms)
+    return hashlib.sha256("\n".join(keys).encode()).hexdigest()[:16]
+
+
+def checkpoint_path(batch_id: str, max_age: float = cache.CACHE_TTL) -> str:
+    """The server's checkpoint file for batch_id.
+
+    Also removes checkpoints not written to for max_age seconds, so an
+    abandoned batch starts over rather than replaying stale rows.
+    """
+    os.makedirs(BATCH_CHECKPOINT_DIR, exist_ok=True)
+    cutoff = time.time() - max_age
+    for entry in os.scandir(BATCH_CHECKPOINT_DIR):
+        try:
+            if entry.name.endswith(".ndjson") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass  # removed by a concurrent request
+    return os.path.join(BATCH_CHECKPOINT_DIR, f"{batch_id}.ndjson")
+
+
+def load_checkpoint(path: str) -> dict:
+    """Finished rows from an earlier run, keyed by normalized term. Errors are retried."""
+    finished = {}
+    if not os.path.exists(path):
+        return finished
+    with open(path) as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by the crash
+            if "result" in row:
+                finished[pipeline.normalize_term(row["searchTerm"])] = row
+    return finished
+
+
+async def _value(term: str) -> dict:
+    try:
+        return {"searchTerm": term, "result": await pipeline.find_cars(term)}
+    except Exception as e:
+        log.warning("batch row %r failed: %s", term, e)
+        return {"searchTerm": term, "error": str(e)}
+
+
+async def run_batch(terms, checkpoint: str | None = None, concurrency: int = BATCH_CONCURRENCY,
+                    replay_finished: bool = True, keep_checkpoint: bool = True):
+    """Values every term, yielding rows in completion order.
+
+    Rows already in `checkpoint` are not valued again; they are yielded first
+    if replay_finished is true. New rows are appended to it as they finish.
+    Unless keep_checkpoint, it is deleted once every row has a result, since
+    only an unfinished batch should resume from it.
+    """
+    terms = dedupe(terms)
+    finished = load_checkpoint(checkpoint) if checkpoint else {}
+    todo = [term for term in terms if pipeline.normalize_term(term) not in finished]
+    log.info("batch of %d terms, %d already finished", len(terms), len(terms) - len(todo))
+    if replay_finished:
+        for row in finished.values():
+            yield row
+
+    queue = asyncio.Queue()
+    for term in todo:
+        queue.put_nowait(term)
+    results = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                term = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await results.put(await _value(term))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(todo)))]
+    out = open(checkpoint, "a") if checkpoint else None
+    failed = 0
+    try:
+        for _ in range(len(todo)):
+            row = await results.get()
+            failed += "result" not in row
+            if out:
+                out.write(json.dumps(row) + "\n")
+                out.flush()
+            yield row
+    finally:
+        for task in workers:
+            task.cancel()
+        if out:
+            out.close()
+    if checkpoint and not keep_checkpoint and not failed:
+        try:
+            os.remove(checkpoint)
+        except FileNotFoundError:
+            pass  # the same batch finished in a concurrent request
+
+
+async def _main(args):
+    with open(args.input) if args.input != "-" else sys.stdin as f:
+        terms = read_terms(f.read())
+    done = 0
+    try:
+        async for row in run_batch(terms, checkpoint=args.output, concurrency=args.concurrency, replay_finished=False):
+            done += 1
+            print(f"[{done}] {'ok   ' if 'result' in row else 'error'} {row['searchTerm']}", file=sys.stderr)
+    finally:
+        await upstream.aclose()
+
+
+if __name__ == "__main__":
+    telemetry.configure_logging()
+    parser = argparse.ArgumentParser(description="Value a CSV of vehicles; one NDJSON row per unique search term.")
+    parser.add_argument("input", help="CSV file of search terms, or - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="NDJSON output file; re-running with it resumes the batch")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,136 @@
+# backend/bench/fakes.py
+"""Local stand-ins for the OpenAI chat-completions and Google Custom Search APIs.
+
+Each upstream has a configurable log-normal latency, error rate and 429 rate,
+so the backend can be load tested with no network and no API spend. Point it
+here with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and
+GOOGLE_SEARCH_URL=http://127.0.0.1:<port>/customsearch/v1.
+
+    python -m bench.fakes --port 9100 --openai-latency-ms 900 --google-latency-ms 400
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class Behaviour:
+    latency_ms: float = 500.0
+    sigma: float = 0.4  # log-normal spread; 0 makes the latency fixed
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_ms: int = 100
+
+    def delay(self) -> float:
+        return self.latency_ms / 1000 * random.lognormvariate(0, self.sigma)
+
+    def failure(self):
+        """A 429/500 response to send instead of a result, or None."""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_exceeded", "code": 429}},
+                status_code=429,
+                headers={"retry-after-ms": str(self.retry_after_ms)},
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            return JSONResponse({"error": {"message": "Internal error (fake)", "type": "server_error"}}, status_code=500)
+        return None
+
+
+def identify(content) -> dict:
+    """Pretends to identify the car: "2022 Audi R8" -> year 2022, make Audi, model R8."""
+    if not isinstance(content, str):
+        return {"make": "Audi", "model": "R8", "year": 2022}  # a photo
+    year = re.search(r"\b(19|20)\d{2}\b", content)
+    words = [w for w in content.split() if not re.fullmatch(r"(19|20)\d{2}", w)] or ["Unknown"]
+    return {
+        "make": words[0].title(),
+        "model": " ".join(words[1:]) or "Model",
+        "year": int(year.group()) if year else 2020,
+        "description": f"A well-kept {content.strip()} with a clean history and plenty of life left.",
+    }
+
+
+def make_app(openai: Behaviour, google: Behaviour) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(openai.delay())
+        if (failed := openai.failure()) is not None:
+            return failed
+
+        content = json.dumps(identify(body["messages"][-1]["content"]))
+        usage = {"prompt_tokens": 250, "completion_tokens": len(content) // 4, "total_tokens": 250 + len(content) // 4}
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "gpt-4o-mini")}
+        if not body.get("stream"):
+            return {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def sse():
+            # The initial delay stands in for time to first token; then ~5 ms per chunk
+            for i in range(0, len(content), 8):
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": content[i:i + 8]}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(0.005)
+            yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    @app.get("/customsearch/v1")
+    async def custom_search(q: str, num: int = 4):
+        await asyncio.sleep(google.delay())
+        if (failed := google.failure()) is not None:
+            return failed
+        slug = re.sub(r"[^a-z0-9]+", "-", q.lower()).strip("-")
+        return {"items": [
+            {"link": f"https://images.example.com/{slug}/{i}.jpg",
+             "image": {"contextLink": f"https://dealer.example.com/{slug}/{i}"}}
+            for i in range(num)
+        ]}
+
+    return app
+
+
+def _add_behaviour_args(parser, name: str, latency_ms: float):
+    parser.add_argument(f"--{name}-latency-ms", type=float, default=latency_ms, help="median latency")
+    parser.add_argument(f"--{name}-sigma", type=float, default=0.4, help="log-normal spread of the latency")
+    parser.add_argument(f"--{name}-error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument(f"--{name}-429-rate", type=float, default=0.0, help="fraction of 429 responses")
+
+
+def _behaviour(args, name: str) -> Behaviour:
+    opts = vars(args)
+    return Behaviour(
+        latency_ms=opts[f"{name}_latency_ms"],
+        sigma=opts[f"{name}_sigma"],
+        error_rate=opts[f"{name}_error_rate"],
+        rate_limit_rate=opts[f"{name}_429_rate"],
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    _add_behaviour_args(parser, "openai", 900)
+    _add_behaviour_args(parser, "google", 400)
+    args = parser.parse_args()
+    uvicorn.run(make_app(_behaviour(args, "openai"), _behaviour(args, "google")),
+                host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,270 @@
+# backend/bench/load.py
+"""Offline load test: runs the backend against the local fakes and measures it.
+
+Starts bench.fakes and a uvicorn server for main:app as subprocesses, drives
+/find-cars, /find-cars/stream or /upload at a fixed concurrency, and reports
+req/s, latency percentiles and event-loop blocking (read from /metrics).
+Results are written as JSON so runs on different commits can be compared.
+The fakes and the driver share the machine's CPUs with the server, so compare
+runs from the same machine and keep it otherwise idle.
+
+    python -m bench.load --endpoint find-cars --concurrency 32 --requests 500 -o before.json
+    python -m bench.load --compare before.json after.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import subprocess
+from collections import Counter
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from bench.fakes import _add_behaviour_args
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODELS = [
+    ("Audi", "R8"), ("Audi", "A4"), ("BMW", "M3"), ("BMW", "X5"), ("Chevrolet", "Corvette"),
+    ("Chevrolet", "Silverado"), ("Ford", "F-150"), ("Ford", "Mustang"), ("Honda", "Civic"),
+    ("Honda", "Accord"), ("Hyundai", "Elantra"), ("Jeep", "Wrangler"), ("Kia", "Telluride"),
+    ("Lexus", "RX"), ("Mazda", "CX-5"), ("Nissan", "Altima"), ("Porsche", "911"),
+    ("Subaru", "Outback"), ("Tesla", "Model 3"), ("Toyota", "Camry"), ("Toyota", "RAV4"),
+]
+
+
+# Phrasings the local catalog cannot resolve, so they go through the OpenAI stand-in
+FREE_FORM = (
+    "{year} {make} {model} low miles",
+    "used {model} around {year}",
+    "{year} {misspelt} {model}",
+)
+
+
+def search_terms(distinct: int, term_mix: float = 0.5) -> list:
+    """distinct search terms, the term_mix fraction of them free-form.
+
+    The rest are "year make model", which /find-cars identifies from the
+    local catalog without calling OpenAI.
+    """
+    vehicles = [(year, make, model) for year in range(2024, 1999, -1) for make, model in MODELS]
+    exact = [f"{year} {make} {model}" for year, make, model in vehicles]
+    free = [
+        template.format(year=year, make=make, model=model, misspelt=make[:-2] + make[-1])
+        for (year, make, model), template in zip(vehicles, FREE_FORM * len(vehicles))
+    ]
+    n_free = round(distinct * term_mix)
+    return free[:n_free] + exact[:distinct - n_free]
+
+
+def _fraction(text: str) -> float:
+    value = float(text)
+    if not 0 <= value <= 1:
+        raise argparse.ArgumentTypeError("must be between 0 and 1")
+    return value
+
+
+def jpeg_images(distinct: int, size=(1600, 1200)) -> list:
+    """Phone-photo-sized JPEGs that differ enough not to share a perceptual hash."""
+    images = []
+    for seed in range(distinct):
+        rng = np.random.default_rng(seed)
+        blocks = rng.integers(0, 255, (6, 8, 3), dtype=np.uint8)
+        img = Image.fromarray(blocks).resize(size, Image.Resampling.BILINEAR)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=90)
+        images.append(out.getvalue())
+    return images
+
+
+def parse_metrics(text: str) -> dict:
+    """Prometheus text -> {"name{labels}": value}."""
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, _, value = line.rpartition(" ")
+            values[series] = float(value)
+    return values
+
+
+def _sum(metrics: dict, prefix: str) -> float:
+    return sum(v for k, v in metrics.items() if k.startswith(prefix))
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_servers(args) -> list:
+    fakes_cmd = [sys.executable, "-m", "bench.fakes", "--port", str(args.fakes_port)]
+    for name in ("openai", "google"):
+        for opt in ("latency_ms", "sigma", "error_rate", "429_rate"):
+            fakes_cmd += [f"--{name}-{opt.replace('_', '-')}", str(vars(args)[f"{name}_{opt}"])]
+
+    fakes = f"http://127.0.0.1:{args.fakes_port}"
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{fakes}/v1",
+        "GOOGLE_API_KEY": "bench",
+        "SEARCH_ENGINE_ID": "bench",
+        "GOOGLE_SEARCH_URL": f"{fakes}/customsearch/v1",
+        "LOG_LEVEL": "WARNING",
+    }
+    env.pop("CACHE_DB", None)
+    if not args.keep_rate_limits:
+        env.update(OPENAI_RPM="100000000", OPENAI_TPM="100000000", GOOGLE_QPM="100000000")
+    if args.no_cache:
+        env["CACHE_MAX_ENTRIES"] = "0"
+    app_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+
+    return [
+        subprocess.Popen(fakes_cmd, cwd=BACKEND_DIR),
+        subprocess.Popen(app_cmd, cwd=BACKEND_DIR, env=env),
+    ]
+
+
+async def wait_ready(client: httpx.AsyncClient, urls: list, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                await client.get(url)
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not come up")
+                await asyncio.sleep(0.1)
+
+
+async def drive(client: httpx.AsyncClient, args) -> tuple:
+    """Sends args.requests requests from args.concurrency workers; returns (latencies, statuses)."""
+    url = f"http://127.0.0.1:{args.port}/{args.endpoint}"
+    if args.endpoint == "upload":
+        payloads = [{"files": {"image": (f"car{i}.jpg", img, "image/jpeg")}} for i, img in enumerate(jpeg_images(args.distinct))]
+    else:
+        payloads = [{"json": {"searchTerm": term}} for term in search_terms(args.distinct, args.term_mix)]
+    order = [random.randrange(len(payloads)) for _ in range(args.requests)]
+    latencies, statuses = [], Counter()
+
+    async def worker():
+        while order:
+            payload = payloads[order.pop()]
+            start = time.perf_counter()
+            try:
+                resp = await client.post(url, **payload)
+                await resp.aread()
+                statuses[resp.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latencies, statuses
+
+
+async def run(args) -> dict:
+    procs = start_servers(args)
+    base = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency + 4)
+    try:
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            await wait_ready(client, [f"http://127.0.0.1:{args.fakes_port}/docs", f"{base}/metrics"])
+            before = parse_metrics((await client.get(f"{base}/metrics")).text)
+            start = time.perf_counter()
+            latencies, statuses = await drive(client, args)
+            duration = time.perf_counter() - start
+            after = parse_metrics((await client.get(f"{base}/metrics")).text)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    blocked = _sum(after, "valueai_event_loop_blocked_seconds_total") - _sum(before, "valueai_event_loop_blocked_seconds_total")
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "requests": args.requests,
+        "ok": statuses.get(200, 0),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "duration_s": round(duration, 3),
+        "rps": round(len(latencies) / duration, 2),
+        "latency_ms": {
+            "mean": round(float(ms.mean()), 1),
+            "p50": round(float(np.percentile(ms, 50)), 1),
+            "p95": round(float(np.percentile(ms, 95)), 1),
+            "p99": round(float(np.percentile(ms, 99)), 1),
+            "max": round(float(ms.max()), 1),
+        },
+        # With --workers > 1 this covers only the worker that answered the /metrics scrapes
+        "event_loop": {
+            "blocked_s": round(blocked, 4),
+            "blocked_pct": round(100 * blocked / duration, 2),
+        },
+        "upstream_errors": round(_sum(after, "valueai_upstream_errors_total") - _sum(before, "valueai_upstream_errors_total")),
+        "openai_tokens": round(_sum(after, "valueai_openai_tokens_total") - _sum(before, "valueai_openai_tokens_total")),
+    }
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'':12}{old.get('commit') or old_path:>14}{new.get('commit') or new_path:>14}{'change':>10}")
+    rows = [("rps", old["rps"], new["rps"])]
+    rows += [(f"{p} ms", old["latency_ms"][p], new["latency_ms"][p]) for p in ("p50", "p95", "p99")]
+    rows += [("loop blocked", old["event_loop"]["blocked_s"], new["event_loop"]["blocked_s"])]
+    for name, a, b in rows:
+        change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+        print(f"{name:12}{a:>14}{b:>14}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend against local fake upstreams.")
+    parser.add_argument("--endpoint", default="find-cars", choices=["find-cars", "find-cars/stream", "upload"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=50, help="distinct search terms / images to cycle through")
+    parser.add_argument("--term-mix", type=_fraction, default=0.5,
+                        help="fraction of search terms that are free-form and need the LLM; the rest resolve from the catalog")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--no-cache", action="store_true", help="disable the result cache")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep the default upstream rate limits")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--fakes-port", type=int, default=9100)
+    _add_behaviour_args(parser, "openai", 900)
+    _add_behaviour_args(parser, "google", 400)
+    parser.add_argument("-o", "--output", help="write the results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# backend/cache.py
+"""TTL + LRU response cache with single-flight coalescing.
+
+Values are JSON-serializable dicts and must be treated as read-only by callers.
+The default backend is in-process memory; set CACHE_DB to a file path to use a
+shared SQLite file instead, so several uvicorn workers (and restarts) share
+one warm cache.
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", str(6 * 60 * 60)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+CACHE_DB = os.getenv("CACHE_DB")
+
+
+class MemoryBackend:
+    """An OrderedDict kept in LRU order; the oldest entry is evicted first."""
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+
+    def get(self, key: str, now: float):
+        entry = self._data.get(key)
+        if entry is None:
+            return None, False
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._data[key]
+            return None, True
+        self._data.move_to_end(key)
+        return value, False
+
+    def set(self, key: str, value, expires_at: float) -> int:
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        evicted = 0
+        now = time.time()
+        while len(self._data) > self.max_entries:
+            _, (old_expires_at, _) = self._data.popitem(last=False)
+            # An expired entry was dead already; SQLiteBackend doesn't count those either
+            evicted += old_expires_at > now
+        return evicted
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """A single SQLite table, LRU by last access time. Safe to share across processes."""
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed_at)")
+
+    def get(self, key: str, now: float):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, False
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None, True
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), False
+
+    def set(self, key: str, value, expires_at: float) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            cur = self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed_at"
+                " LIMIT max(0, (SELECT count(*) FROM cache) - ?))",
+                (self.max_entries,),
+            )
+            return cur.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM cache").fetchone()[0]
+
+
+class ResponseCache:
+    """Async front-end over a backend: TTL, counters and in-flight coalescing."""
+
+    def __init__(self, backend, ttl: float = CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    async def _call(self, fn, *args):
+        # SQLite may wait on another worker's write lock; keep that off the event loop
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get(self, key: str):
+        value, expired = await self._call(self.backend.get, key, time.time())
+        if expired:
+            self.expirations += 1
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value):
+        self.evictions += await self._call(self.backend.set, key, value, time.time() + self.ttl)
+
+    async def get_or_compute(self, key: str, compute, cacheable=None):
+        """Returns the cached value for key, or awaits compute() exactly once.
+
+        Concurrent callers for the same missing key share one computation.
+        Failures are not cached and are raised to every waiter, and neither
+        are values for which cacheable(value) is false.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fill(key, compute, cacheable))
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._finish(key, f))
+        else:
+            self.coalesced += 1
+        # A disconnecting client must not cancel the computation other waiters share
+        return await asyncio.shield(future)
+
+    async def _fill(self, key: str, compute, cacheable):
+        value = await compute()
+        if cacheable is None or cacheable(value):
+            await self.set(key, value)
+        return value
+
+    def join(self, key: str):
+        """The future of a computation in flight for key (counted as coalesced), or None."""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        return future
+
+    def track(self, key: str, future):
+        """Registers a computation driven elsewhere (e.g. a stream) as in flight for key.
+
+        get_or_compute() and join() callers for key then wait on future
+        instead of starting their own. Caching its value is up to the caller.
+        """
+        self._inflight[key] = future
+        future.add_done_callback(lambda f: self._finish(key, f))
+
+    def _finish(self, key: str, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()  # mark as retrieved even if every waiter went away
+
+    def stats(self) -> dict:
+        return {
+            "backend": "sqlite" if self.backend.blocking else "memory",
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+def make_cache(db_path: str | None = CACHE_DB, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL):
+    backend = SQLiteBackend(db_path, max_entries) if db_path else MemoryBackend(max_entries)
+    return ResponseCache(backend, ttl)
+
+
+results = make_cache()
@@ -0,0 +1,227 @@
+# backend/catalog.py
+"""In-memory vehicle catalog (make -> model -> years/trims) from data/catalog.tsv.
+
+Backs /autocomplete and lets /find-cars identify well-formed searches such as
+"2022 Audi R8" or "audi r8 2022" locally, without the LLM round-trip. The
+catalog is loaded on first use, so worker startup does not pay for it.
+"""
+import os
+import re
+import bisect
+import datetime
+import threading
+from array import array
+
+import valuation
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "catalog.tsv"))
+FIRST_YEAR = 1930
+
+# Common nicknames, as typed by users -> the make's name in the catalog
+MAKE_ALIASES = {
+    "chevy": "chevrolet",
+    "vw": "volkswagen",
+    "mercedes": "mercedes-benz",
+    "benz": "mercedes-benz",
+    "merc": "mercedes-benz",
+    "alfa": "alfa romeo",
+    "landrover": "land rover",
+    "caddy": "cadillac",
+}
+
+SEGMENT_BLURBS = {
+    "economy": "an affordable, efficient everyday car",
+    "mainstream": "a practical and popular all-rounder",
+    "truck": "a capable workhorse built for towing and hauling",
+    "luxury": "a comfortable, well-equipped luxury vehicle",
+    "ev": "an all-electric vehicle",
+    "sports": "a performance-focused car for enthusiasts",
+    "exotic": "a high-end exotic with serious performance",
+    "hypercar": "a limited-production hypercar",
+}
+
+
+def _tokens(text: str) -> list:
+    return re.findall(r"[a-z0-9]+", str(text).lower())
+
+
+def _is_year(token: str) -> bool:
+    return len(token) == 4 and token[:2] in ("19", "20") and token.isdigit()
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Catalog:
+    """Parallel arrays indexed by entry id, plus the lookup structures over them."""
+
+    def __init__(self, rows):
+        self.makes, self.models, self.trims = [], [], []
+        self.make_of = array("H")
+        self.years = []  # bitmask, bit i = model year FIRST_YEAR + i
+        make_ids = {}
+        for make, model, years, trims in rows:
+            if make not in make_ids:
+                make_ids[make] = len(self.makes)
+                self.makes.append(make)
+            self.make_of.append(make_ids[make])
+            self.models.append(model)
+            self.years.append(self._year_mask(years))
+            self.trims.append(tuple(t for t in trims.split(",") if t))
+
+        aliases = {}
+        for alias, make in MAKE_ALIASES.items():
+            aliases.setdefault(make, []).append(alias)
+
+        # exact: sorted tokens of "make model" -> id, so word order doesn't matter
+        # names: sorted (name, id) for prefix search on "make model" and on "model"
+        # Both also hold the model with its tokens joined: "F150" and "CX5" as
+        # well as "F-150" and "CX-5"
+        self.exact = {}
+        names = []
+        self.trigrams = {}
+        for i, model in enumerate(self.models):
+            make = self.makes[self.make_of[i]].lower()
+            model_tokens = _tokens(model)
+            spellings = {" ".join(model_tokens), "".join(model_tokens)}
+            for make_name in [make] + aliases.get(make, []):
+                full = _tokens(make_name) + model_tokens
+                self.exact[" ".join(sorted(full))] = i
+                self.exact.setdefault(" ".join(sorted(_tokens(make_name) + ["".join(model_tokens)])), i)
+                names += [(f"{' '.join(_tokens(make_name))} {spelling}", i) for spelling in spellings]
+            names += [(spelling, i) for spelling in spellings]
+            grams = set()
+            for spelling in spellings:
+                grams |= _trigrams(f"{' '.join(_tokens(make))} {spelling}")
+            for gram in grams:
+                self.trigrams.setdefault(gram, array("H")).append(i)
+        names.sort()
+        self.names = [name for name, _ in names]
+        self.name_ids = array("H", [i for _, i in names])
+
+    @staticmethod
+    def _year_mask(spec: str) -> int:
+        # An open range ("2019-") runs through next year's models, which go on sale this year
+        newest = datetime.date.today().year + 1
+        mask = 0
+        for part in spec.split(","):
+            first, dash, last = part.partition("-")
+            for year in range(int(first), int(last or (newest if dash else first)) + 1):
+                mask |= 1 << (year - FIRST_YEAR)
+        return mask
+
+    def made_in(self, i: int, year: int) -> bool:
+        return year >= FIRST_YEAR and bool(self.years[i] >> (year - FIRST_YEAR) & 1)
+
+    def car(self, i: int, year: int | None = None) -> dict:
+        car = {"make": self.makes[self.make_of[i]], "model": self.models[i]}
+        if year is not None:
+            car["year"] = year
+        return car
+
+    def resolve(self, term: str) -> dict | None:
+        """{"make", "model", "year"} if term is exactly a year plus a known make and model."""
+        tokens = _tokens(term)
+        years = [t for t in tokens if _is_year(t)]
+        if len(years) != 1:
+            return None
+        rest = sorted(t for t in tokens if t != years[0])
+        i = self.exact.get(" ".join(rest))
+        if i is None or not self.made_in(i, int(years[0])):
+            return None
+        return self.car(i, int(years[0]))
+
+    def complete(self, query: str, limit: int = 8) -> list:
+        """Suggestions for a partly typed query: prefix matches first, then fuzzy ones."""
+        tokens = _tokens(query)
+        years = [int(t) for t in tokens if _is_year(t)]
+        year = years[0] if years else None
+        text = " ".join(t for t in tokens if not _is_year(t))
+        if not text:
+            return []
+
+        found = []
+        seen = set()
+
+        def add(i):
+            if i not in seen and (year is None or self.made_in(i, year)):
+                seen.add(i)
+                found.append(i)
+
+        start = bisect.bisect_left(self.names, text)
+        for pos in range(start, len(self.names)):
+            if len(found) >= limit or not self.names[pos].startswith(text):
+                break
+            add(self.name_ids[pos])
+
+        if len(found) < limit:
+            grams = _trigrams(text)
+            scores = {}
+            inner = set()  # ids matching more than the start of a word
+            for gram in grams:
+                for i in self.trigrams.get(gram, ()):
+                    scores[i] = scores.get(i, 0) + 1
+                    if gram[0] != " ":
+                        inner.add(i)
+            # "  c" and " ca" alone would match every name with a word starting "ca"
+            threshold = max(2, len(grams) // 2)
+            for i, score in sorted(scores.items(), key=lambda item: -item[1]):
+                if score < threshold or len(found) >= limit:
+                    break
+                if i in inner:
+                    add(i)
+
+        suggestions = []
+        for i in found:
+            car = self.car(i, year)
+            label = f"{car['make']} {car['model']}"
+            suggestions.append({"label": f"{year} {label}" if year else label, **car})
+        return suggestions
+
+    def describe(self, car: dict) -> str:
+        """A short, template description for a car identified without the LLM."""
+        blurb = SEGMENT_BLURBS[valuation.segment_for(car.get("make"), car.get("model"))]
+        text = f"The {car.get('year')} {car.get('make')} {car.get('model')} is {blurb}."
+        i = self.exact.get(" ".join(sorted(_tokens(f"{car.get('make')} {car.get('model')}"))))
+        if i is not None and len(self.trims[i]) > 1:
+            trims = self.trims[i][:4]
+            text += f" It was offered in trims such as {', '.join(trims[:-1])} and {trims[-1]}."
+        return text
+
+
+def _read(path: str) -> list:
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                fields = line.rstrip("\n").split("\t")
+                rows.append((fields + [""] * 4)[:4])
+    return rows
+
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def get() -> Catalog:
+    """The shared catalog, loaded on first use."""
+    global _catalog
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                _catalog = Catalog(_read(CATALOG_PATH))
+    return _catalog
+
+
+def resolve(term: str) -> dict | None:
+    return get().resolve(term)
+
+
+def autocomplete(query: str, limit: int = 8) -> list:
+    return get().complete(query, limit)
+
+
+def describe(car: dict) -> str:
+    return get().describe(car)
@@ -0,0 +1,78 @@
+# backend/jsonstream.py
+"""Incremental parser for a JSON object that arrives in pieces (e.g. LLM streaming)."""
+import json
+
+
+class ObjectStream:
+    """Feeds text chunks of one top-level JSON object and reports what completed.
+
+    feed() returns a list of events:
+      ("item", key, index, value)  an element of a top-level array finished
+      ("member", key, value)       a top-level member finished
+
+    Only the new text is scanned on each call, so total work is linear in the
+    size of the object.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+        self._array_key = None
+        self._item_start = None
+        self._item_index = 0
+
+    def feed(self, text: str) -> list:
+        self._buf += text
+        events = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append(ch)
+                if len(self._stack) == 1:
+                    self._member_start = i + 1
+                elif len(self._stack) == 2 and ch == "[":
+                    self._array_key = self._member_key(buf[self._member_start:i])
+                    self._item_start = i + 1
+                    self._item_index = 0
+            elif ch in ",}]":
+                depth = len(self._stack)
+                if depth == 0:
+                    continue  # stray text outside the object, e.g. a trailing bracket
+                if depth == 2 and self._stack[-1] == "[" and self._array_key is not None:
+                    item = buf[self._item_start:i].strip()
+                    if item:
+                        events.append(("item", self._array_key, self._item_index, json.loads(item)))
+                        self._item_index += 1
+                    self._item_start = i + 1
+                elif depth == 1:
+                    member = buf[self._member_start:i].strip()
+                    if member:
+                        key, value = next(iter(json.loads("{" + member + "}").items()))
+                        events.append(("member", key, value))
+                    self._member_start = i + 1
+                if ch != ",":
+                    self._stack.pop()
+                    if len(self._stack) == 1:
+                        self._array_key = None
+        self._pos = len(buf)
+        return events
+
+    @staticmethod
+    def _member_key(text: str) -> str:
+        return json.loads(text.rsplit(":", 1)[0].strip())
@@ -1,75 +1,97 @@
 # backend/main.py
-import os
 import json
-import base64
-from dotenv import load_dotenv
-from openai import OpenAI
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from googleapiclient.discovery import build
+from starlette.datastructures import UploadFile
 
-# Load environment variables
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-SEARCH_ENGINE_ID = os.getenv("SEARCH_ENGINE_ID")
+import batch
+import cache
+import catalog
+import upstream
+import pipeline
+import vision
+import telemetry
+import thumbnails
 
-# Initialize clients
-client = OpenAI(api_key=OPENAI_API_KEY)
-app = FastAPI()
+telemetry.configure_logging()
+log = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    monitor = None
+    if telemetry.EVENT_LOOP_MONITOR_INTERVAL > 0:
+        monitor = asyncio.create_task(telemetry.monitor_event_loop())
+    yield
+    if monitor:
+        monitor.cancel()
+    await upstream.aclose()
+
+# Initialize app
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(telemetry.RequestMetrics)
+
+@app.post("/upload")
+async def upload_image(request: Request):
+    """Values the car in a photo, posted as multipart/form-data with an "image" field."""
+    # Parsing the form spools every file part to disk, so an oversized upload
+    # has to be refused on its Content-Length before the body is read at all
+    length = request.headers.get("content-length")
+    if length is None:
+        raise HTTPException(status_code=411, detail="Content-Length is required.")
+    if not length.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid Content-Length.")
+    if int(length) > vision.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Image is too large.")
 
-# Helper function for Google Image Search
-def fetch_car_images_and_links(query: str, num: int = 4):
-    """Fetches car images and their source page links from Google."""
-    # Use a more specific query to get commercial-style photos
-    smart_query = f'{query} for sale car'
-    print(f"DEBUG: Searching Google Images with query: '{smart_query}'")
     try:
-        if not GOOGLE_API_KEY or not SEARCH_ENGINE_ID:
-            raise ValueError("Google API Key or Search Engine ID is missing.")
-
-        service = build("customsearch", "v1", developerKey=GOOGLE_API_KEY)
-        res = service.cse().list(
-            q=smart_query,
-            cx=SEARCH_ENGINE_ID,
-            searchType='image',
-            num=num,
-            imgSize='LARGE',
-            safe='high'
-        ).execute()
-
-        items = res.get('items', [])
-        print(f"DEBUG: Found {len(items)} images from search.")
-        
-        if not items:
-            raise ValueError("No images found from Google Search.")
-
-        # Extract both image URL and the page URL it came from
-        image_data = []
-        for item in items:
-            image_data.append({
-                "imageUrl": item.get('link'),
-                "sourceUrl": item.get('image', {}).get('contextLink')
-            })
-        return image_data
-        
+        form = await request.form(max_files=1, max_fields=10)
     except Exception as e:
-        print(f"!!! GOOGLE IMAGE SEARCH ERROR: {e}")
-        return []
+        log.info("could not parse upload form: %s", e)
+        raise HTTPException(status_code=400, detail="Could not read the upload.")
+    image = form.get("image")
+    if not isinstance(image, UploadFile):
+        raise HTTPException(status_code=400, detail="No image in the upload.")
+    if not (image.content_type or "").startswith("image/"):
+        raise HTTPException(status_code=415, detail="Please upload an image file.")
+    data = await image.read()
 
-# The /upload endpoint is not part of this flow, but is kept
-@app.post("/upload")
-async def upload_image(image: UploadFile = File(...)):
-    # ... (code for image upload) ...
-    return {"message": "Upload endpoint is not fully implemented for this flow."}
+    try:
+        with telemetry.span("decode"):
+            jpeg, phash = await asyncio.to_thread(vision.prepare_image, data)
+    except Exception as e:
+        log.info("could not decode upload: %s", e)
+        raise HTTPException(status_code=400, detail="Could not read the image.")
+
+    try:
+        # Re-uploads and near-duplicates of a recent photo skip the vision call
+        car = vision.identified.get(phash)
+        if car is None:
+            car = await vision.identify_image(jpeg)
+            if car.get("error") or not pipeline.vehicle_key(car):
+                raise HTTPException(status_code=422, detail=car.get("error") or "Could not identify a car in the image.")
+            vision.identified.set(phash, car)
+        log.debug("identified %s from upload (phash %016x, %d bytes)", pipeline.vehicle_query(car), phash, len(jpeg))
+
+        parsed_json = await pipeline.find_car(car)
+        return JSONResponse(content=parsed_json)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception("upload failed: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
 
 class FindCarsRequest(BaseModel):
     searchTerm: str
@@ -77,77 +99,107 @@ class FindCarsRequest(BaseModel):
 @app.post("/find-cars")
 async def find_cars(req: FindCarsRequest):
     try:
-        chat_resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            response_format={"type": "json_object"},
-            messages=[
-                {
-                  "role": "system",
-                  "content": """
-You are a helpful car valuation assistant.
-User will provide a car description like "2022 Audi R8".
-You must reply with only a JSON object in this exact format. Generate plausible but FAKE data.
-
-- For "priceHistoryMonthly", generate data for the last 12 months with multiple data points.
-- For "priceHistoryYearly", generate a history ONLY from the car's manufacturing year up to the current year (2025).
-
-{
-  "make": "string",
-  "model": "string",
-  "year": 2022,
-  "valueRange": "string",
-  "description": "string",
-  "priceHistoryMonthly": [
-    { "name": "12m ago", "value": 150000 },
-    { "name": "10m ago", "value": 148000 },
-    { "name": "8m ago", "value": 147000 },
-    { "name": "6m ago", "value": 145000 },
-    { "name": "4m ago", "value": 144000 },
-    { "name": "2m ago", "value": 143000 },
-    { "name": "current", "value": 142000 }
-  ],
-  "priceHistoryYearly": [
-    { "name": "2022", "value": 160000 },
-    { "name": "2023", "value": 155000 },
-    { "name": "2024", "value": 149000 },
-    { "name": "2025", "value": 142000 }
-  ],
-  "listings": [
-    { "id": 1, "title": "2022 Audi R8 Coupe", "price": "$155,900", "mileage": "8,500 miles" },
-    { "id": 2, "title": "2022 Audi R8 Spyder", "price": "$162,500", "mileage": "5,200 miles" },
-    { "id": 3, "title": "2022 Audi R8 V10", "price": "$158,000", "mileage": "11,000 miles" },
-    { "id": 4, "title": "2022 Audi R8 Performance", "price": "$171,000", "mileage": "3,100 miles" }
-  ]
-}
-                  """.strip()
-                },
-                {"role": "user", "content": req.searchTerm}
-            ],
-            temperature=0.5
-        )
-        
-        parsed_json = json.loads(chat_resp.choices[0].message.content)
-
-        # Fetch REAL car images and source links from Google
-        search_query = f"{parsed_json.get('year')} {parsed_json.get('make')} {parsed_json.get('model')}"
-        image_data = fetch_car_images_and_links(search_query, num=4)
-        
-        # MERGE the AI-generated listings with the real image/link data
-        if image_data:
-            if 'listings' not in parsed_json:
-                parsed_json['listings'] = []
-
-            for i, listing in enumerate(parsed_json.get('listings', [])):
-                if i < len(image_data):
-                    listing['imageUrl'] = image_data[i].get('imageUrl')
-                    listing['sourceUrl'] = image_data[i].get('sourceUrl')
-        
-        # This key is no longer used by the frontend but kept for potential future use
-        parsed_json['imageUrls'] = [item.get('imageUrl') for item in image_data if item.get('imageUrl')]
-        
-        print(f"DEBUG: Final data sent to frontend: {json.dumps(parsed_json, indent=2)}")
-        return JSONResponse(content=parsed_json)
+        parsed_json = await pipeline.find_cars(req.searchTerm)
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("final data sent to frontend: %s", json.dumps(parsed_json))
+        with telemetry.span("serialize"):
+            return JSONResponse(content=parsed_json)
 
     except Exception as e:
-        print(f"!!! MAIN ENDPOINT ERROR: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        log.exception("find-cars failed: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/find-cars/stream")
+async def find_cars_stream(req: FindCarsRequest):
+    """Same pipeline as /find-cars, as NDJSON events (see pipeline.stream_find_cars)."""
+    async def ndjson():
+        try:
+            async for event in pipeline.stream_find_cars(req.searchTerm):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            log.exception("find-cars stream failed: %s", e)
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.get("/autocomplete")
+async def autocomplete(q: str = "", limit: int = 8):
+    """Vehicle suggestions for the search box, from the local catalog (no upstream calls)."""
+    return {"suggestions": catalog.autocomplete(q, limit=max(1, min(limit, 20)))}
+
+
+@app.get("/img")
+async def image_proxy(request: Request, u: str, s: str, w: int = thumbnails.IMAGE_DEFAULT_WIDTH):
+    """A listing photo resized to one of thumbnails.IMAGE_WIDTHS, as WebP if accepted, else JPEG."""
+    if not thumbnails.verify(u, s):
+        raise HTTPException(status_code=403, detail="Invalid image signature.")
+    width = thumbnails.snap_width(w)
+    fmt = thumbnails.pick_format(request.headers.get("accept", ""))
+    etag = '"%s"' % thumbnails.variant_name(u, width, fmt)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={thumbnails.IMAGE_MAX_AGE}, immutable",
+        "Vary": "Accept",
+    }
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        data = await thumbnails.thumbnail(u, width, fmt)
+    except thumbnails.ImageError as e:
+        log.info("image proxy failed: %s", e)
+        raise HTTPException(status_code=502, detail="Could not load the image.")
+    return Response(content=data, media_type=thumbnails.FORMATS[fmt], headers=headers)
+
+
+class BatchRequest(BaseModel):
+    searchTerms: list[str]
+
+@app.post("/find-cars/batch")
+async def find_cars_batch(request: Request):
+    """Values a list (JSON {"searchTerms": [...]}) or CSV (text/csv) of vehicles.
+
+    Rows stream back as NDJSON in completion order. Posting the same list
+    again after an interruption or failed rows resumes it from its
+    checkpoint instead of starting over.
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("text/csv"):
+            terms = batch.read_terms(body.decode("utf-8-sig"))
+        else:
+            terms = BatchRequest.model_validate_json(body).searchTerms
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    terms = batch.dedupe(terms)
+    if not terms:
+        raise HTTPException(status_code=400, detail="No search terms given.")
+    if len(terms) > batch.BATCH_MAX_TERMS:
+        raise HTTPException(status_code=413, detail=f"At most {batch.BATCH_MAX_TERMS} vehicles per batch.")
+
+    batch_id = batch.batch_id(terms)
+    checkpoint = await asyncio.to_thread(batch.checkpoint_path, batch_id)
+
+    async def ndjson():
+        async for row in batch.run_batch(terms, checkpoint=checkpoint, keep_checkpoint=False):
+            yield json.dumps(row) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers={"X-Batch-Id": batch_id})
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.results.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: per-stage and per-upstream latency, errors, tokens, cache."""
+    for event, value in cache.results.stats().items():
+        if event not in ("backend", "entries", "inflight"):
+            telemetry.cache_events.set(value, event=event)
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,417 @@
+# backend/pipeline.py
+"""The /find-cars pipeline: identify the car, value it, find real photos, merge them."""
+import re
+import json
+import asyncio
+import logging
+
+import cache
+import catalog
+import upstream
+import valuation
+import telemetry
+import jsonstream
+import thumbnails
+
+log = logging.getLogger(__name__)
+
+FIND_CARS_PROMPT = """
+You are a helpful car identification assistant.
+User will provide a car description like "2022 Audi R8".
+You must reply with only a JSON object in this exact format:
+
+{
+  "make": "string",
+  "model": "string",
+  "year": 2022,
+  "description": "string"
+}
+
+"description" is two or three sentences about the car for a buyer.
+""".strip()
+
+
+def normalize_term(term: str) -> str:
+    """Canonical form of a search term: "Audi R8 2022 " == "2022 audi r8"."""
+    return " ".join(sorted(re.findall(r"[a-z0-9]+", term.lower())))
+
+
+def vehicle_query(car: dict) -> str:
+    """The "year make model" string for an identified car."""
+    return f"{car.get('year')} {car.get('make')} {car.get('model')}"
+
+
+def vehicle_key(car: dict) -> str | None:
+    """Cache key for an identified (year, make, model), or None if incomplete."""
+    if not all(car.get(field) for field in ("year", "make", "model")):
+        return None
+    return "car:" + normalize_term(vehicle_query(car))
+
+
+# Helper function for Google Image Search
+async def fetch_car_images_and_links(query: str, num: int = 4):
+    """Fetches car images and their source page links from Google."""
+    # Use a more specific query to get commercial-style photos
+    smart_query = f'{query} for sale car'
+    log.debug("searching Google Images with query %r", smart_query)
+    try:
+        with telemetry.span("image_search"):
+            items = await upstream.google_image_search(smart_query, num=num)
+        log.debug("found %d images from search", len(items))
+
+        if not items:
+            raise ValueError("No images found from Google Search.")
+
+        # Extract both image URL and the page URL it came from; images are
+        # served resized through our /img proxy rather than hotlinked
+        image_data = []
+        for item in items:
+            link = item.get('link')
+            image_data.append({
+                "imageUrl": thumbnails.proxy_url(link) if link else None,
+                "sourceUrl": item.get('image', {}).get('contextLink')
+            })
+        return image_data
+
+    except Exception as e:
+        log.warning("Google image search failed: %s", e)
+        return []
+
+
+async def identify_car(search_term: str) -> dict:
+    """Asks the LLM for the car's make, model, year and a short description."""
+    with telemetry.span("identify"):
+        chat_resp = await upstream.chat_json(FIND_CARS_PROMPT, search_term)
+    with telemetry.span("parse"):
+        return json.loads(chat_resp.choices[0].message.content)
+
+
+def identify_locally(search_term: str) -> dict | None:
+    """The car for a well-formed "year make model" term, from the local catalog.
+
+    Returns None when the term needs the LLM (typos, free-form text, unknown
+    models); the description is then a short template rather than generated.
+    """
+    with telemetry.span("catalog"):
+        car = catalog.resolve(search_term)
+        if car is not None:
+            car["description"] = catalog.describe(car)
+    return car
+
+
+def appraise(car: dict) -> dict:
+    """The identified car plus its locally computed valuation fields."""
+    with telemetry.span("valuation"):
+        return {**car, **valuation.appraise(car)}
+
+
+def attach_image(listing: dict, image_data: list, i: int) -> dict:
+    """Gives the i-th listing the i-th real image and its source page."""
+    if i < len(image_data):
+        listing['imageUrl'] = image_data[i].get('imageUrl')
+        listing['sourceUrl'] = image_data[i].get('sourceUrl')
+    return listing
+
+
+def merge_listings(parsed_json: dict, image_data: list) -> dict:
+    """MERGE the generated listings with the real image/link data."""
+    if image_data:
+        if 'listings' not in parsed_json:
+            parsed_json['listings'] = []
+
+        for i, listing in enumerate(parsed_json.get('listings', [])):
+            attach_image(listing, image_data, i)
+
+    # This key is no longer used by the frontend but kept for potential future use
+    parsed_json['imageUrls'] = [item.get('imageUrl') for item in image_data if item.get('imageUrl')]
+    return parsed_json
+
+
+async def find_cars(search_term: str) -> dict:
+    """Runs the whole pipeline for one search term, through the result cache.
+
+    Results are cached under the normalized search term, and concurrent
+    identical searches share a single upstream round-trip. Results without
+    images (e.g. the image search failed) are not cached.
+    """
+    term_key = "term:" + normalize_term(search_term)
+    return await cache.results.get_or_compute(
+        term_key, lambda: _find_cars_uncached(search_term), cacheable=has_images
+    )
+
+
+async def find_car(car: dict) -> dict:
+    """Runs the pipeline for an already identified car (e.g. from a photo).
+
+    Skips identification. The result is cached under the vehicle key, so it
+    is shared with text searches that resolve to the same car.
+    """
+    return await cache.results.get_or_compute(
+        vehicle_key(car), lambda: _find_car_uncached(car), cacheable=has_images
+    )
+
+
+async def _find_car_uncached(car: dict) -> dict:
+    parsed_json = appraise(car)
+    image_data = await fetch_car_images_and_links(vehicle_query(car), num=4)
+    return merge_listings(parsed_json, image_data)
+
+
+def has_images(result: dict) -> bool:
+    return bool(result.get('imageUrls'))
+
+
+async def _find_cars_uncached(search_term: str) -> dict:
+    """Identifies the car and fetches its images.
+
+    The image search starts speculatively from the raw search term while the
+    LLM call is in flight, so wall time is max(LLM, search) rather than the sum.
+    It is only re-issued if the identified year/make/model differs.
+    Once identified, a result cached for the same vehicle under a different
+    spelling is reused instead of searching again. Terms the local catalog
+    recognises skip the LLM altogether.
+    """
+    car = identify_locally(search_term)
+    if car is not None:
+        return await find_car(car)
+
+    image_task = asyncio.create_task(fetch_car_images_and_links(search_term, num=4))
+    try:
+        parsed_json = appraise(await identify_car(search_term))
+    except BaseException:
+        image_task.cancel()
+        raise
+
+    async def search_images():
+        search_query = vehicle_query(parsed_json)
+        if normalize_term(search_query) == normalize_term(search_term):
+            image_data = await image_task
+        else:
+            image_task.cancel()
+            image_data = await fetch_car_images_and_links(search_query, num=4)
+        return merge_listings(parsed_json, image_data)
+
+    car_key = vehicle_key(parsed_json)
+    if not car_key:
+        return await search_images()
+    try:
+        # Shares a cached or in-flight result for the same vehicle, from any spelling or endpoint
+        return await cache.results.get_or_compute(car_key, search_images, cacheable=has_images)
+    finally:
+        image_task.cancel()  # unused if another computation answered
+
+
+VEHICLE_FIELDS = ("make", "model", "year")
+VALUATION_FIELDS = ("valueRange", "priceHistoryMonthly", "priceHistoryYearly")
+
+
+def _event(kind: str, source: dict, fields) -> dict:
+    return {"type": kind, **{f: source[f] for f in fields if f in source}}
+
+
+def result_events(result: dict):
+    """The stream events for an already complete result (e.g. a cache hit)."""
+    yield _event("vehicle", result, VEHICLE_FIELDS)
+    yield _event("valuation", result, VALUATION_FIELDS)
+    if "description" in result:
+        yield {"type": "description", "description": result["description"]}
+    for listing in result.get("listings", []):
+        yield {"type": "listing", "listing": listing}
+    yield {"type": "done", "imageUrls": result.get("imageUrls", [])}
+
+
+class _Broadcast:
+    """The events of one in-flight stream, replayed to every subscriber as they arrive."""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, event: dict):
+        self.events.append(event)
+        self._wake()
+
+    def close(self, error: BaseException | None = None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        i = 0
+        while True:
+            while i < len(self.events):
+                yield self.events[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+# term key -> the stream computing it, for identical searches to join
+_streams = {}
+
+
+async def stream_find_cars(search_term: str):
+    """Runs the pipeline for one search term, yielding events as stages finish.
+
+    Events, in order: "vehicle" (make/model/year), "valuation" (value range
+    and price histories), "description", one "listing" per listing with its
+    image merged, then "done". The LLM response is streamed and parsed
+    incrementally, so the vehicle and its valuation follow the model's first
+    few tokens, or immediately when the local catalog recognises the term.
+    The image search is settled as soon as the vehicle is known.
+
+    Like find_cars, concurrent identical searches share one computation: the
+    first runs it in the background and the others receive the same events.
+    """
+    term_key = "term:" + normalize_term(search_term)
+    cached = await cache.results.get(term_key)
+    if cached is not None:
+        for event in result_events(cached):
+            yield event
+        return
+
+    broadcast = _streams.get(term_key)
+    if broadcast is not None:
+        cache.results.join(term_key)
+    else:
+        # A non-streaming /find-cars for the same term may already be running
+        future = cache.results.join(term_key)
+        if future is not None:
+            for event in result_events(await asyncio.shield(future)):
+                yield event
+            return
+        broadcast = _Broadcast()
+        _streams[term_key] = broadcast
+        result_future = asyncio.get_running_loop().create_future()
+        cache.results.track(term_key, result_future)
+        # Runs to completion even if this client disconnects, as other subscribers may not
+        broadcast.task = asyncio.create_task(_run_stream(search_term, term_key, broadcast, result_future))
+
+    async for event in broadcast.subscribe():
+        yield event
+
+
+async def _run_stream(search_term: str, term_key: str, broadcast: _Broadcast, result_future: asyncio.Future):
+    try:
+        async for event in _stream_uncached(search_term, term_key, result_future):
+            broadcast.publish(event)
+    except BaseException as e:
+        log.debug("stream for %r failed: %s", search_term, e)
+        if not result_future.done():
+            if isinstance(e, Exception):
+                result_future.set_exception(e)
+            else:
+                result_future.cancel()
+        broadcast.close(e)
+        if not isinstance(e, Exception):
+            raise
+    else:
+        broadcast.close()
+    finally:
+        _streams.pop(term_key, None)
+
+
+async def _shared_result(car_key: str | None):
+    """A cached or in-flight result for the same vehicle, from any spelling or endpoint."""
+    if not car_key:
+        return None
+    cached = await cache.results.get(car_key)
+    if cached is None and (future := cache.results.join(car_key)) is not None:
+        cached = await asyncio.shield(future)
+    return cached
+
+
+async def _stream_uncached(search_term: str, term_key: str, result_future: asyncio.Future):
+    """The events of stream_find_cars; resolves result_future with the final result."""
+    car = identify_locally(search_term)
+    if car is not None:
+        car_key = vehicle_key(car)
+        shared = await _shared_result(car_key)
+        if shared is not None:
+            result_future.set_result(shared)
+            for event in result_events(shared):
+                yield event
+            return
+        cache.results.track(car_key, result_future)
+        image_task = asyncio.create_task(fetch_car_images_and_links(vehicle_query(car), num=4))
+        result = appraise(car)
+        for event in result_events(result):
+            if event["type"] in ("vehicle", "valuation", "description"):
+                yield event
+    else:
+        image_task = asyncio.create_task(fetch_car_images_and_links(search_term, num=4))
+        llm = upstream.chat_json_stream(FIND_CARS_PROMPT, search_term)
+        parser = jsonstream.ObjectStream()
+        car = {}
+        result = None
+        try:
+            async for text in llm:
+                for event in parser.feed(text):
+                    if event[0] != "member":
+                        continue
+                    _, key, value = event
+                    car[key] = value
+                    if result is None and all(f in car for f in VEHICLE_FIELDS):
+                        yield _event("vehicle", car, VEHICLE_FIELDS)
+
+                        # Same vehicle under another spelling: replay it and stop generating
+                        car_key = vehicle_key(car)
+                        shared = await _shared_result(car_key)
+                        if shared is not None:
+                            image_task.cancel()
+                            result_future.set_result(shared)
+                            for event in list(result_events(shared))[1:]:
+                                yield event
+                            return
+                        if car_key:
+                            cache.results.track(car_key, result_future)
+
+                        result = appraise(car)
+                        yield _event("valuation", result, VALUATION_FIELDS)
+                        if "description" in car:
+                            yield {"type": "description", "description": car["description"]}
+
+                        search_query = vehicle_query(car)
+                        if normalize_term(search_query) != normalize_term(search_term):
+                            image_task.cancel()
+                            image_task = asyncio.create_task(fetch_car_images_and_links(search_query, num=4))
+                    elif result is not None:
+                        result[key] = value
+                        if key == "description":
+                            yield {"type": "description", "description": value}
+        except BaseException:
+            image_task.cancel()
+            raise
+        finally:
+            await llm.aclose()
+
+        if result is None:
+            # The model never gave all of make/model/year; value what we have
+            result = appraise(car)
+            for event in result_events(result):
+                if event["type"] in ("vehicle", "valuation", "description"):
+                    yield event
+
+    image_data = await image_task
+    for i, listing in enumerate(result.get("listings", [])):
+        yield {"type": "listing", "listing": attach_image(listing, image_data, i)}
+
+    result = merge_listings(result, image_data)
+    if has_images(result):
+        await cache.results.set(term_key, result)
+        car_key = vehicle_key(result)
+        if car_key:
+            await cache.results.set(car_key, result)
+    # Resolved once cached, so a late joiner finds it in one place or the other
+    result_future.set_result(result)
+    yield {"type": "done", "imageUrls": result["imageUrls"]}
@@ -0,0 +1,327 @@
+# backend/telemetry.py
+"""Logging setup, per-stage timing spans, Prometheus metrics and a sampling profiler.
+
+Metrics are kept in-process and rendered in the Prometheus text format by
+GET /metrics; no client library is needed. With several uvicorn workers each
+worker reports its own numbers.
+"""
+import os
+import json
+import time
+import bisect
+import random
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+import httpx
+import openai
+
+try:
+    import pyinstrument
+except ImportError:  # optional: falls back to cProfile
+    pyinstrument = None
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_JSON = os.getenv("LOG_JSON", "") not in ("", "0", "false")
+# Fraction of requests to profile, and how slow one must be for its profile to be kept
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "2000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# How often to probe event-loop lag; 0 disables the monitor
+EVENT_LOOP_MONITOR_INTERVAL = float(os.getenv("EVENT_LOOP_MONITOR_INTERVAL", "0.05"))
+
+log = logging.getLogger(__name__)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields."""
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in self.RESERVED})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    handler = logging.StreamHandler()
+    if LOG_JSON:
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+
+
+# --- Metrics ---------------------------------------------------------------
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _series(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        self.values[self._key(labels)] += amount
+
+    def set(self, value: float, **labels):
+        """For mirroring a counter kept elsewhere (e.g. the cache's own counters)."""
+        self.values[self._key(labels)] = value
+
+    def render(self):
+        lines = super().render()
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{self._series(key)} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.values[self._key(labels)] -= amount
+
+
+class Histogram(_Metric):
+    """Prometheus histogram, plus p50/p95/p99 estimated from the buckets."""
+    kind = "histogram"
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.counts = defaultdict(lambda: [0] * (len(self.BUCKETS) + 1))
+        self.sums = defaultdict(float)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        self.counts[key][bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.sums[key] += value
+
+    def quantile(self, q: float, key: tuple) -> float:
+        """Linear interpolation inside the bucket holding the q-th observation."""
+        counts = self.counts[key]
+        target = q * sum(counts)
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= target:
+                lower = self.BUCKETS[i - 1] if i > 0 else 0.0
+                upper = self.BUCKETS[i] if i < len(self.BUCKETS) else self.BUCKETS[-1]
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+        return 0.0
+
+    def render(self):
+        lines = super().render()
+        for key in sorted(self.counts):
+            counts, total = self.counts[key], 0
+            for bound, count in zip(self.BUCKETS + ("+Inf",), counts):
+                total += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._series(key, le)} {total}")
+            lines.append(f"{self.name}_sum{self._series(key)} {self.sums[key]:g}")
+            lines.append(f"{self.name}_count{self._series(key)} {total}")
+        if self.counts:
+            lines.append(f"# HELP {self.name}_quantile {self.help} (estimated quantiles)")
+            lines.append(f"# TYPE {self.name}_quantile gauge")
+            for key in sorted(self.counts):
+                for q in self.QUANTILES:
+                    label = 'quantile="%s"' % q
+                    lines.append(f"{self.name}_quantile{self._series(key, label)} {self.quantile(q, key):g}")
+        return lines
+
+
+REGISTRY = []
+
+stage_seconds = Histogram("valueai_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+upstream_seconds = Histogram("valueai_upstream_seconds", "Latency of upstream API calls", ["upstream"])
+upstream_errors = Counter("valueai_upstream_errors_total", "Failed or retried upstream calls", ["upstream", "kind"])
+request_seconds = Histogram("valueai_request_seconds", "Time to serve a request, through the last body byte", ["endpoint"])
+requests_in_flight = Gauge("valueai_requests_in_flight", "Requests currently being served", ["endpoint"])
+openai_tokens = Counter("valueai_openai_tokens_total", "OpenAI tokens used, from response usage", ["model", "kind"])
+cache_events = Counter("valueai_cache_events_total", "Result cache hits, misses, evictions, ...", ["event"])
+image_cache_events = Counter("valueai_image_cache_events_total", "Thumbnail cache hits, misses and evictions", ["event"])
+loop_lag_seconds = Histogram("valueai_event_loop_lag_seconds", "How late the event loop woke a sleeping probe")
+loop_blocked_seconds = Counter("valueai_event_loop_blocked_seconds_total", "Total event-loop lag seen by the probe")
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def span(stage: str):
+    """Times a block as a pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        log.debug("stage %s took %.1f ms", stage, elapsed * 1000)
+
+
+async def monitor_event_loop(interval: float = EVENT_LOOP_MONITOR_INTERVAL):
+    """Sleeps `interval` in a loop; any overshoot is time the loop was blocked."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - start - interval, 0.0)
+        loop_lag_seconds.observe(lag)
+        loop_blocked_seconds.inc(lag)
+
+
+def _error_kind(exc: BaseException) -> str:
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException, openai.APITimeoutError)):
+        return "timeout"
+    if isinstance(exc, openai.RateLimitError) or getattr(getattr(exc, "response", None), "status_code", None) == 429:
+        return "rate_limited"
+    return "error"
+
+
+@contextmanager
+def upstream_call(upstream: str):
+    """Times an upstream call and counts it by failure kind if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        upstream_errors.inc(upstream=upstream, kind=_error_kind(e))
+        raise
+    finally:
+        upstream_seconds.observe(time.perf_counter() - start, upstream=upstream)
+
+
+def record_usage(model: str, usage):
+    if usage is None:
+        return
+    openai_tokens.inc(usage.prompt_tokens, model=model, kind="prompt")
+    openai_tokens.inc(usage.completion_tokens, model=model, kind="completion")
+
+
+class RequestMetrics:
+    """ASGI middleware: in-flight gauge, request latency and sampled profiling.
+
+    Pure ASGI rather than BaseHTTPMiddleware so streamed responses are timed
+    until their last byte, not just until the headers go out.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.paths = None
+
+    def _endpoint(self, scope) -> str:
+        # Label by route path only, so arbitrary URLs can't blow up cardinality
+        if self.paths is None:
+            self.paths = {route.path for route in scope["app"].routes if hasattr(route, "path")}
+        return scope["path"] if scope["path"] in self.paths else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        endpoint = self._endpoint(scope)
+        requests_in_flight.inc(endpoint=endpoint)
+        profile = maybe_profile(endpoint)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_flight.dec(endpoint=endpoint)
+            request_seconds.observe(elapsed, endpoint=endpoint)
+            if profile:
+                profile.finish(elapsed)
+
+
+# --- Sampling profiler -------------------------------------------------------
+
+_profiling = threading.Lock()
+
+
+class _Profile:
+    """Profiles one sampled request; the result is kept only if the request was slow."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        if pyinstrument:
+            self.profiler = pyinstrument.Profiler(async_mode="enabled")
+            self.profiler.start()
+        else:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def finish(self, elapsed: float):
+        if pyinstrument:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+        _profiling.release()
+        if elapsed * 1000 < PROFILE_SLOW_MS:
+            return
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stem = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}-{self.endpoint.strip('/').replace('/', '_')}")
+        if pyinstrument:
+            with open(stem + ".html", "w") as f:
+                f.write(self.profiler.output_html())
+        else:
+            self.profiler.dump_stats(stem + ".prof")
+        log.warning("slow request to %s (%.0f ms) profiled to %s", self.endpoint, elapsed * 1000, stem)
+
+
+def maybe_profile(endpoint: str):
+    """Starts a profile for a sampled request, or returns None.
+
+    Only one request is profiled at a time, since a profiler sees the whole
+    event loop.
+    """
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    if not _profiling.acquire(blocking=False):
+        return None
+    return _Profile(endpoint)
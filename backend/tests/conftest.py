@@ -0,0 +1,9 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+# The backend is a flat set of modules run from backend/ (uvicorn main:app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing upstream builds the OpenAI client, which insists on a key
+os.environ.setdefault("OPENAI_API_KEY", "test")
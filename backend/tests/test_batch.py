@@ -0,0 +1,87 @@
+# backend/tests/test_batch.py
+import os
+import json
+import time
+import asyncio
+
+import pytest
+
+import batch
+import pipeline
+
+
+def _run(terms, **kwargs):
+    async def collect():
+        return [row async for row in batch.run_batch(terms, **kwargs)]
+    return asyncio.run(collect())
+
+
+def _fake_find_cars(monkeypatch, calls, fail=()):
+    async def find_cars(term):
+        calls.append(term)
+        if term in fail:
+            raise RuntimeError("upstream down")
+        return {"term": term}
+    monkeypatch.setattr(pipeline, "find_cars", find_cars)
+
+
+def test_finished_batch_removes_its_checkpoint(monkeypatch, tmp_path):
+    calls = []
+    _fake_find_cars(monkeypatch, calls)
+    checkpoint = str(tmp_path / "b.ndjson")
+    rows = _run(["2020 Honda Civic", "2019 Ford F-150"], checkpoint=checkpoint, keep_checkpoint=False)
+    assert len(rows) == 2 and all("result" in row for row in rows)
+    assert not os.path.exists(checkpoint)
+
+
+def test_failed_rows_keep_the_checkpoint_and_are_retried(monkeypatch, tmp_path):
+    calls = []
+    _fake_find_cars(monkeypatch, calls, fail={"2019 Ford F-150"})
+    checkpoint = str(tmp_path / "b.ndjson")
+    _run(["2020 Honda Civic", "2019 Ford F-150"], checkpoint=checkpoint, keep_checkpoint=False)
+    assert os.path.exists(checkpoint)
+
+    calls.clear()
+    _fake_find_cars(monkeypatch, calls)
+    rows = _run(["2020 Honda Civic", "2019 Ford F-150"], checkpoint=checkpoint, keep_checkpoint=False)
+    assert calls == ["2019 Ford F-150"]
+    assert {row["searchTerm"] for row in rows} == {"2020 Honda Civic", "2019 Ford F-150"}
+    assert not os.path.exists(checkpoint)
+
+
+def test_cli_keeps_its_output(monkeypatch, tmp_path):
+    _fake_find_cars(monkeypatch, [])
+    output = str(tmp_path / "out.ndjson")
+    _run(["2020 Honda Civic"], checkpoint=output)
+    with open(output) as f:
+        assert [json.loads(line)["searchTerm"] for line in f] == ["2020 Honda Civic"]
+
+
+def test_stale_checkpoints_are_removed(monkeypatch, tmp_path):
+    monkeypatch.setattr(batch, "BATCH_CHECKPOINT_DIR", str(tmp_path))
+    stale, fresh = tmp_path / "old.ndjson", tmp_path / "new.ndjson"
+    stale.write_text("{}\n")
+    fresh.write_text("{}\n")
+    past = time.time() - 7200
+    os.utime(stale, (past, past))
+    assert batch.checkpoint_path("new", max_age=3600) == str(fresh)
+    assert sorted(os.listdir(tmp_path)) == ["new.ndjson"]
+
+
+def test_read_terms_by_column_name():
+    assert batch.read_terms("Stock #,Search Term\n101,2020 Honda Civic\n102,2019 Ford F-150\n") == [
+        "2020 Honda Civic", "2019 Ford F-150",
+    ]
+
+
+def test_read_terms_from_year_make_model():
+    assert batch.read_terms("Make,Model,Year\nHonda,Civic,2020\n") == ["2020 Honda Civic"]
+
+
+def test_read_terms_plain_list():
+    assert batch.read_terms("2020 Honda Civic\n\n2019 Ford F-150\n") == ["2020 Honda Civic", "2019 Ford F-150"]
+
+
+def test_read_terms_rejects_an_unknown_header():
+    with pytest.raises(ValueError, match="searchTerm"):
+        batch.read_terms("Stock#,Vehicle Description\n101,2020 Honda Civic\n")
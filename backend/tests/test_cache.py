@@ -0,0 +1,154 @@
+# backend/tests/test_cache.py
+import asyncio
+
+import pytest
+
+import cache
+
+
+class Clock:
+    """Stands in for time.time() so TTLs and LRU order don't depend on timing."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        self.now += 0.001
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make(request, tmp_path, clock):
+    def make(max_entries=100, ttl=60):
+        db_path = str(tmp_path / "cache.db") if request.param == "sqlite" else None
+        return cache.make_cache(db_path=db_path, max_entries=max_entries, ttl=ttl)
+    return make
+
+
+def test_ttl_expiry(make, clock):
+    async def main():
+        results = make(ttl=60)
+        await results.set("k", {"v": 1})
+        assert await results.get("k") == {"v": 1}
+        clock.now += 61
+        assert await results.get("k") is None
+        return results.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["entries"]) == (1, 1, 1, 0)
+
+
+def test_lru_eviction(make):
+    async def main():
+        results = make(max_entries=3)
+        for key in "abc":
+            await results.set(key, {"v": key})
+        await results.get("a")  # b is now the least recently used
+        await results.set("d", {"v": "d"})
+        await results.set("e", {"v": "e"})
+        return results, {key: await results.get(key) is not None for key in "abcde"}
+
+    results, present = asyncio.run(main())
+    assert present == {"a": True, "b": False, "c": False, "d": True, "e": True}
+    assert results.stats()["evictions"] == 2
+    assert results.stats()["entries"] == 3
+
+
+def test_expired_entries_are_not_counted_as_evictions(make, clock):
+    async def main():
+        results = make(max_entries=2, ttl=60)
+        await results.set("old", {"v": 0})
+        clock.now += 61
+        await results.set("a", {"v": 1})
+        await results.set("b", {"v": 2})
+        return results
+
+    results = asyncio.run(main())
+    assert results.stats()["evictions"] == 0
+
+
+def test_sqlite_is_shared_between_workers(tmp_path, clock):
+    async def main():
+        path = str(tmp_path / "cache.db")
+        one, two = cache.make_cache(db_path=path), cache.make_cache(db_path=path)
+        await one.set("k", {"v": 1})
+        return await two.get("k")
+
+    assert asyncio.run(main()) == {"v": 1}
+
+
+def test_burst_of_identical_requests_computes_once(make):
+    computed = []
+
+    async def compute():
+        computed.append(1)
+        await asyncio.sleep(0.05)
+        return {"v": 1}
+
+    async def main():
+        results = make()
+        values = await asyncio.gather(*(results.get_or_compute("k", compute) for _ in range(50)))
+        return results, values
+
+    results, values = asyncio.run(main())
+    assert len(computed) == 1
+    assert all(value == {"v": 1} for value in values)
+    stats = results.stats()
+    assert stats["coalesced"] == 49 and stats["inflight"] == 0 and stats["entries"] == 1
+
+
+def test_uncacheable_values_are_not_stored(make):
+    computed = []
+
+    async def compute():
+        computed.append(1)
+        return {"imageUrls": []}
+
+    async def main():
+        results = make()
+        for _ in range(2):
+            await results.get_or_compute("k", compute, cacheable=lambda value: bool(value["imageUrls"]))
+        return results
+
+    results = asyncio.run(main())
+    assert len(computed) == 2
+    assert results.stats()["entries"] == 0
+
+
+def test_failures_reach_every_waiter_and_are_not_cached(make):
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        results = make()
+        outcomes = await asyncio.gather(*(results.get_or_compute("k", compute) for _ in range(5)),
+                                        return_exceptions=True)
+        return results, outcomes
+
+    results, outcomes = asyncio.run(main())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert results.stats()["entries"] == 0 and results.stats()["inflight"] == 0
+
+
+def test_cancelled_waiter_does_not_cancel_the_computation(make):
+    async def compute():
+        await asyncio.sleep(0.05)
+        return {"v": 1}
+
+    async def main():
+        results = make()
+        first = asyncio.create_task(results.get_or_compute("k", compute))
+        second = asyncio.create_task(results.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, await results.get("k")
+
+    assert asyncio.run(main()) == ({"v": 1}, {"v": 1})
@@ -0,0 +1,60 @@
+# backend/tests/test_catalog.py
+import datetime
+
+import pytest
+
+import catalog
+
+
+def _labels(query, limit=8):
+    return [s["label"] for s in catalog.autocomplete(query, limit)]
+
+
+@pytest.mark.parametrize("term", ["2020 Ford F-150", "2020 ford f150", "f150 ford 2020", "2020 F 150 Ford"])
+def test_resolve_any_spelling_and_word_order(term):
+    assert catalog.resolve(term) == {"make": "Ford", "model": "F-150", "year": 2020}
+
+
+def test_resolve_make_alias():
+    assert catalog.resolve("2019 chevy silverado 1500") == {"make": "Chevrolet", "model": "Silverado 1500", "year": 2019}
+
+
+@pytest.mark.parametrize("term", [
+    "Ford F-150",                   # no year
+    "2020 2021 Ford F-150",         # two years
+    "2020 Ford F-150 low miles",    # extra words
+    "1990 Tesla Model 3",           # not made that year
+])
+def test_resolve_leaves_the_rest_to_the_llm(term):
+    assert catalog.resolve(term) is None
+
+
+def test_resolve_current_model_beyond_the_data():
+    next_year = datetime.date.today().year + 1
+    assert catalog.resolve(f"{next_year} Toyota Camry") is not None
+
+
+def test_complete_prefix():
+    assert _labels("2022 audi r8")[0] == "2022 Audi R8"
+    assert _labels("mustang")[:2] == ["Ford Mustang", "Ford Mustang Mach-E"]
+
+
+def test_complete_joined_model_name():
+    assert _labels("f15")[0] == "Ford F-150"
+    assert _labels("cx5")[0] == "Mazda CX-5"
+
+
+def test_complete_fuzzy_needs_more_than_a_word_start():
+    labels = _labels("camr")
+    assert labels[0] == "Toyota Camry"
+    assert not any(label.startswith("Cadillac") for label in labels)
+
+
+def test_complete_misspelling():
+    assert _labels("toyta camry") == ["Toyota Camry"]
+    assert _labels("civc")[0] == "Honda Civic"
+
+
+def test_complete_filters_by_year():
+    assert "Tesla Model 3" not in " ".join(_labels("1995 tesla"))
+    assert _labels("") == []
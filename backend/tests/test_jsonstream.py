@@ -0,0 +1,59 @@
+# backend/tests/test_jsonstream.py
+import json
+
+import pytest
+
+from jsonstream import ObjectStream
+
+OBJECT = {
+    "make": "Audi",
+    "model": "R8 \"V10, plus\"",
+    "listings": [
+        {"title": "R8 [coupe], low miles}", "price": 120000},
+        {"title": "Spyder {convertible]", "price": 135000},
+    ],
+    "notes": ["a,b", "]}", "back\\slash"],
+    "description": "Ends with brackets ]} and a comma,",
+}
+
+EXPECTED = [
+    ("member", "make", "Audi"),
+    ("member", "model", OBJECT["model"]),
+    ("item", "listings", 0, OBJECT["listings"][0]),
+    ("item", "listings", 1, OBJECT["listings"][1]),
+    ("member", "listings", OBJECT["listings"]),
+    ("item", "notes", 0, "a,b"),
+    ("item", "notes", 1, "]}"),
+    ("item", "notes", 2, "back\\slash"),
+    ("member", "notes", OBJECT["notes"]),
+    ("member", "description", OBJECT["description"]),
+]
+
+
+def _feed(text, size):
+    stream = ObjectStream()
+    events = []
+    for i in range(0, len(text), size):
+        events += stream.feed(text[i:i + size])
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_events_do_not_depend_on_chunking(size):
+    assert _feed(json.dumps(OBJECT), size) == EXPECTED
+
+
+@pytest.mark.parametrize("size", [1, 3])
+def test_pretty_printed(size):
+    assert _feed(json.dumps(OBJECT, indent=2), size) == EXPECTED
+
+
+def test_events_arrive_as_soon_as_complete():
+    stream = ObjectStream()
+    assert stream.feed('{"make": "Audi", "model": "R') == [("member", "make", "Audi")]
+    assert stream.feed('8", "listings": [{"price": 1}') == [("member", "model", "R8")]
+    assert stream.feed(', {"price"') == [("item", "listings", 0, {"price": 1})]
+
+
+def test_text_outside_the_object_is_ignored():
+    assert _feed('{"make": "Audi"}\n]}', 1) == [("member", "make", "Audi")]
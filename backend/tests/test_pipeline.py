@@ -0,0 +1,125 @@
+# backend/tests/test_pipeline.py
+import json
+import asyncio
+
+import pytest
+
+import cache
+import pipeline
+import thumbnails
+import upstream
+
+TERM = "fast red german supercar"  # free-form, so the catalog leaves it to the LLM
+CAR = {"make": "Audi", "model": "R8", "year": 2019, "description": "A mid-engined V10."}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Fake upstreams that count their calls; a fresh in-memory result cache."""
+    calls = {"llm": 0, "google": 0}
+
+    async def chat_json_stream(system, content, **kwargs):
+        calls["llm"] += 1
+        text = json.dumps(CAR)
+        for i in range(0, len(text), 5):
+            await asyncio.sleep(0.002)
+            yield text[i:i + 5]
+
+    async def chat_json(system, content, **kwargs):
+        raise AssertionError("the streamed pipeline should not make a non-streaming call")
+
+    async def google_image_search(query, num=4):
+        calls["google"] += 1
+        await asyncio.sleep(0.02)
+        return [{"link": f"https://img.example/{i}.jpg", "image": {"contextLink": f"https://dealer.example/{i}"}}
+                for i in range(num)]
+
+    monkeypatch.setattr(upstream, "chat_json_stream", chat_json_stream)
+    monkeypatch.setattr(upstream, "chat_json", chat_json)
+    monkeypatch.setattr(upstream, "google_image_search", google_image_search)
+    monkeypatch.setattr(cache, "results", cache.make_cache(db_path=None))
+    monkeypatch.setattr(thumbnails, "_secret", b"test")
+    return calls
+
+
+async def _collect(term):
+    return [event async for event in pipeline.stream_find_cars(term)]
+
+
+def test_stream_events(calls):
+    events = asyncio.run(_collect(TERM))
+    types = [event["type"] for event in events]
+    assert types[:3] == ["vehicle", "valuation", "description"]
+    assert types[-1] == "done" and "listing" in types
+    assert events[0]["make"] == "Audi"
+
+
+def test_concurrent_identical_streams_share_one_computation(calls):
+    async def main():
+        return await asyncio.gather(*(_collect(TERM) for _ in range(20)))
+
+    results = asyncio.run(main())
+    assert calls["llm"] == 1
+    assert all(events == results[0] for events in results)
+    assert results[0][-1]["type"] == "done"
+    stats = cache.results.stats()
+    assert stats["coalesced"] == 19 and stats["inflight"] == 0
+    assert not pipeline._streams
+
+
+def test_stream_and_find_cars_share_one_computation(calls):
+    async def main():
+        return await asyncio.gather(_collect(TERM), pipeline.find_cars(TERM), _collect(TERM.upper()))
+
+    events, result, upper = asyncio.run(main())
+    assert calls["llm"] == 1
+    assert result["make"] == "Audi" and events == upper
+
+
+def test_disconnecting_subscriber_does_not_stop_the_others(calls):
+    async def leave_early():
+        stream = pipeline.stream_find_cars(TERM)
+        first = await anext(stream)
+        await stream.aclose()
+        return first
+
+    async def main():
+        first, events = await asyncio.gather(leave_early(), _collect(TERM))
+        return first, events, await cache.results.get("term:" + pipeline.normalize_term(TERM))
+
+    first, events, cached = asyncio.run(main())
+    assert first["type"] == "vehicle"
+    assert events[-1]["type"] == "done"
+    assert calls["llm"] == 1
+    assert cached is not None
+
+
+def test_first_subscriber_leaving_still_caches_the_result(calls):
+    async def main():
+        stream = pipeline.stream_find_cars(TERM)
+        await anext(stream)
+        await stream.aclose()
+        await asyncio.sleep(0.3)  # the shared computation carries on in the background
+        return await _collect(TERM)
+
+    events = asyncio.run(main())
+    assert calls["llm"] == 1
+    assert events[-1]["type"] == "done"
+
+
+def test_failure_reaches_every_subscriber(calls, monkeypatch):
+    async def failing_stream(system, content, **kwargs):
+        calls["llm"] += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+        yield ""
+
+    monkeypatch.setattr(upstream, "chat_json_stream", failing_stream)
+
+    async def main():
+        return await asyncio.gather(*(_collect(TERM) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert calls["llm"] == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not pipeline._streams and cache.results.stats()["inflight"] == 0
@@ -0,0 +1,44 @@
+# backend/tests/test_thumbnails.py
+import os
+import time
+
+import thumbnails
+
+
+def _age(directory, name, seconds):
+    path = os.path.join(directory, name)
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    disk = thumbnails.DiskCache(str(tmp_path), max_bytes=250)
+    for i, name in enumerate(["a", "b", "c"]):
+        disk.set(name, b"x" * 100)
+        _age(tmp_path, name, 30 - i)
+    assert sorted(os.listdir(tmp_path)) == ["b", "c"]
+    assert disk.evictions == 1
+    assert disk.get("a") is None
+    assert disk.get("b") == b"x" * 100
+
+
+def test_disk_cache_sees_files_from_another_worker(tmp_path):
+    one = thumbnails.DiskCache(str(tmp_path), max_bytes=10_000)
+    two = thumbnails.DiskCache(str(tmp_path), max_bytes=10_000)
+    one.set("shared", b"data")
+    assert two.get("shared") == b"data"
+    assert len(two) == 1
+
+
+def test_disk_cache_bound_covers_every_worker(tmp_path):
+    one = thumbnails.DiskCache(str(tmp_path), max_bytes=250, scan_interval=0)
+    two = thumbnails.DiskCache(str(tmp_path), max_bytes=250, scan_interval=0)
+    one.set("a", b"x" * 100)
+    _age(tmp_path, "a", 30)
+    two.set("b", b"x" * 100)
+    _age(tmp_path, "b", 20)
+    # Neither worker has written 250 bytes itself, but the directory would hold 300
+    one.set("c", b"x" * 100)
+    two.set("d", b"x" * 100)
+    assert sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)) <= 250
+    assert "a" not in os.listdir(tmp_path)
@@ -0,0 +1,129 @@
+# backend/tests/test_upstream.py
+import asyncio
+
+import httpx
+import pytest
+
+import upstream
+
+
+def _call(log, delays):
+    """make_call() for _hedged: the i-th copy sleeps delays[i], then returns i or raises."""
+    def make_call():
+        i = len(log)
+        log.append("started")
+
+        async def call():
+            try:
+                await asyncio.sleep(abs(delays[i]))
+            except asyncio.CancelledError:
+                log[i] = "cancelled"
+                raise
+            log[i] = "finished"
+            if delays[i] < 0:
+                raise RuntimeError(f"copy {i} failed")
+            return i
+        return call()
+    return make_call
+
+
+def test_hedged_fast_call_is_not_hedged():
+    log = []
+    assert asyncio.run(upstream._hedged(_call(log, [0.01]), delay=0.2)) == 0
+    assert log == ["finished"]
+
+
+def test_hedged_slow_call_races_a_second_copy():
+    log = []
+    assert asyncio.run(upstream._hedged(_call(log, [0.5, 0.01]), delay=0.05)) == 1
+    assert log == ["cancelled", "finished"]
+
+
+def test_hedged_raises_when_every_copy_fails():
+    log = []
+    with pytest.raises(RuntimeError):
+        asyncio.run(upstream._hedged(_call(log, [-0.1, -0.01]), delay=0.05))
+
+
+def test_hedged_skips_the_copy_without_budget():
+    log = []
+    limiter = upstream.RateLimiter(60)
+    limiter.level = 0
+    assert asyncio.run(upstream._hedged(_call(log, [0.1, 0.01]), delay=0.02, limiter=limiter)) == 0
+    assert log == ["finished"]
+
+
+@pytest.mark.parametrize("cancel_after", [0.02, 0.1])
+def test_hedged_cancelled_caller_cancels_every_copy(cancel_after):
+    # 0.02 s lands in the hedge delay, 0.1 s after the second copy started
+    log = []
+
+    async def main():
+        task = asyncio.create_task(upstream._hedged(_call(log, [0.5, 0.5]), delay=0.05))
+        await asyncio.sleep(cancel_after)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert log and all(state == "cancelled" for state in log)
+
+
+HOSTS = {"img.example": ["93.184.216.34"], "intranet.example": ["10.0.0.5"], "v6.example": ["::1"]}
+
+
+@pytest.fixture
+def image_host(monkeypatch):
+    """Fake DNS and image hosts; returns the list of URLs actually requested."""
+    requested = []
+
+    async def resolve(host, port):
+        return HOSTS[host]
+
+    def handler(request):
+        requested.append(str(request.url))
+        location = request.url.params.get("to")
+        if location:
+            return httpx.Response(302, headers={"location": location})
+        return httpx.Response(200, content=b"jpeg")
+
+    monkeypatch.setattr(upstream, "_resolve", resolve)
+    monkeypatch.setattr(upstream, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return requested
+
+
+def test_fetch_image_follows_public_redirects(image_host):
+    data = asyncio.run(upstream.fetch_image("https://img.example/a.jpg?to=https://img.example/b.jpg", 100))
+    assert data == b"jpeg"
+    assert image_host[-1] == "https://img.example/b.jpg"
+
+
+@pytest.mark.parametrize("target", [
+    "http://127.0.0.1/admin",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::ffff:10.0.0.1]/",
+    "http://intranet.example/",
+    "http://v6.example/",
+    "file:///etc/passwd",
+])
+def test_fetch_image_refuses_internal_targets(image_host, target):
+    with pytest.raises(ValueError, match="refusing"):
+        asyncio.run(upstream.fetch_image(target, 100))
+    with pytest.raises(ValueError, match="refusing"):
+        asyncio.run(upstream.fetch_image(f"https://img.example/a.jpg?to={target}", 100))
+    assert all(url.startswith("https://img.example/") for url in image_host)
+
+
+def test_fetch_image_limits_redirects(image_host, monkeypatch):
+    monkeypatch.setattr(upstream, "IMAGE_MAX_REDIRECTS", 2)
+    url = "https://img.example/a.jpg"
+    for _ in range(3):
+        url = str(httpx.URL("https://img.example/a.jpg", params={"to": url}))
+    with pytest.raises(ValueError, match="redirects"):
+        asyncio.run(upstream.fetch_image(url, 100))
+
+
+def test_fetch_image_size_cap(image_host):
+    with pytest.raises(ValueError, match="larger"):
+        asyncio.run(upstream.fetch_image("https://img.example/a.jpg", 3))
@@ -0,0 +1,60 @@
+# backend/tests/test_valuation.py
+import datetime
+
+import pytest
+
+import valuation
+
+TODAY = datetime.date(2026, 6, 15)
+
+
+@pytest.mark.parametrize("make, model, segment", [
+    ("Mercedes-Benz", "G-Class", "exotic"),
+    ("Mercedes-Benz", "G550", "exotic"),
+    ("Mercedes-Benz", "GLA", "luxury"),
+    ("Mercedes-Benz", "GLC", "luxury"),
+    ("Mercedes-Benz", "GLE", "luxury"),
+    ("Mercedes-Benz", "GLS", "luxury"),
+    ("Mercedes-Benz", "EQS", "ev"),
+    ("BMW", "M3", "sports"),
+    ("BMW", "M340i", "sports"),
+    ("BMW", "i4", "ev"),
+    ("BMW", "iX", "ev"),
+    ("BMW", "X5", "luxury"),
+    ("Ford", "F-150", "truck"),
+    ("Ford", "Mustang Mach-E", "ev"),
+    ("Audi", "R8", "exotic"),
+    ("Toyota", "GR Supra", "sports"),
+    ("Unknown", "Thing", "mainstream"),
+])
+def test_segment_for(make, model, segment):
+    assert valuation.segment_for(make, model) == segment
+
+
+def _low(value_range: str) -> int:
+    return int(value_range.split(" - ")[0].strip("$").replace(",", ""))
+
+
+def test_appraise_shape_and_determinism():
+    car = {"make": "Honda", "model": "Civic", "year": 2020}
+    first = valuation.appraise(car)
+    assert first == valuation.appraise(car)
+    assert first["valueRange"].startswith("$")
+    assert len(first["priceHistoryMonthly"]) == len(valuation.MONTHS_AGO)
+    assert len(first["listings"]) == valuation.LISTINGS_PER_VEHICLE
+
+
+def test_appraise_gla_is_not_priced_like_an_exotic():
+    gla, r8 = valuation.appraise_many(
+        [{"make": "Mercedes-Benz", "model": "GLA", "year": 2022}, {"make": "Audi", "model": "R8", "year": 2022}],
+        today=TODAY,
+    )
+    assert _low(gla["valueRange"]) < _low(r8["valueRange"]) / 2
+
+
+def test_appraise_older_is_cheaper():
+    new, old = valuation.appraise_many(
+        [{"make": "Toyota", "model": "Camry", "year": 2024}, {"make": "Toyota", "model": "Camry", "year": 2012}],
+        today=TODAY,
+    )
+    assert _low(old["valueRange"]) < _low(new["valueRange"])
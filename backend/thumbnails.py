@@ -0,0 +1,289 @@
+# backend/thumbnails.py
+"""Resized listing photos for the /img proxy, kept in a size-bounded disk cache.
+
+Listings point at /img?u=<source>&w=<width>&s=<signature> instead of the
+photo's host. Each source is downloaded once and reduced to a master image no
+wider than the largest width; every (width, format) variant is rendered from
+that master on first request and then served from disk. Only URLs signed by
+this backend are proxied, so /img cannot be used to fetch arbitrary URLs.
+The signing key is IMAGE_PROXY_SECRET, or else one generated on first use and
+kept in IMAGE_CACHE_DIR, so proxy URLs survive restarts and work on any
+worker sharing that directory. Set IMAGE_PROXY_SECRET when workers do not
+share a disk.
+"""
+import io
+import os
+import hmac
+import asyncio
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from PIL import Image, ImageOps
+
+import upstream
+import telemetry
+
+log = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# How often a worker rescans the directory for files other workers added
+IMAGE_CACHE_SCAN_INTERVAL = float(os.getenv("IMAGE_CACHE_SCAN_INTERVAL", "60"))
+IMAGE_WIDTHS = (320, 640, 1280)
+IMAGE_DEFAULT_WIDTH = 640
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_MAX_SOURCE_BYTES = int(os.getenv("IMAGE_MAX_SOURCE_BYTES", str(20 * 1024 * 1024)))
+# A variant's URL and ETag never change meaning, so browsers may keep it for good
+IMAGE_MAX_AGE = int(os.getenv("IMAGE_MAX_AGE", str(30 * 24 * 60 * 60)))
+IMAGE_PROXY_SECRET = os.getenv("IMAGE_PROXY_SECRET")
+SECRET_FILE = ".proxy_secret"
+
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+class ImageError(Exception):
+    """The source image could not be fetched or decoded."""
+
+
+_secret = None
+
+
+def _signing_key() -> bytes:
+    global _secret
+    if _secret is None:
+        if IMAGE_PROXY_SECRET:
+            _secret = IMAGE_PROXY_SECRET.encode()
+        else:
+            _secret = _shared_secret(os.path.join(IMAGE_CACHE_DIR, SECRET_FILE))
+    return _secret
+
+
+def _shared_secret(path: str) -> bytes:
+    """The secret stored at path, created by whichever process gets there first."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(secrets.token_hex(32).encode())
+    try:
+        # Linking fails if the file exists, and a reader never sees it half written
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+    with open(path, "rb") as f:
+        return f.read().strip()
+
+
+def sign(url: str) -> str:
+    return hmac.new(_signing_key(), url.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def verify(url: str, signature: str) -> bool:
+    return hmac.compare_digest(sign(url), signature)
+
+
+def proxy_url(url: str, width: int = IMAGE_DEFAULT_WIDTH) -> str:
+    """The /img path serving url resized to width. Relative to the API's origin."""
+    return "/img?" + urlencode({"u": url, "w": width, "s": sign(url)})
+
+
+def snap_width(width: int) -> int:
+    """The smallest fixed width >= width (or the largest one)."""
+    return next((w for w in IMAGE_WIDTHS if w >= width), IMAGE_WIDTHS[-1])
+
+
+def pick_format(accept: str) -> str:
+    return "webp" if "image/webp" in accept else "jpeg"
+
+
+def variant_name(url: str, width: int, fmt: str) -> str:
+    """Disk cache file name for a variant; doubles as its strong ETag."""
+    digest = hashlib.sha256(url.encode()).hexdigest()[:32]
+    return f"{digest}-{width}-q{IMAGE_QUALITY}.{fmt}"
+
+
+def _master_name(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:32] + "-master.jpg"
+
+
+class DiskCache:
+    """Files in one directory, evicted least recently used first once over max_bytes.
+
+    The directory may be shared by several workers, so the disk is the source
+    of truth: file mtimes give the LRU order (hits touch the file), a miss in
+    this process's index still looks on disk, and eviction works from a fresh
+    directory scan. Blocking; call it from a worker thread.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, scan_interval: float = IMAGE_CACHE_SCAN_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.scan_interval = scan_interval
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuilds the index (name -> size, oldest first) from the directory."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith(".") and not entry.name.endswith(".tmp"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self._files = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.size = sum(self._files.values())
+        self._scanned = time.monotonic()
+
+    def get(self, name: str) -> bytes | None:
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Never written, or evicted by another worker sharing the directory
+            with self._lock:
+                self.size -= self._files.pop(name, 0)
+            return None
+        with self._lock:
+            # Possibly written by another worker; index it so eviction counts it
+            self.size += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+        return data
+
+    def set(self, name: str, data: bytes):
+        path = os.path.join(self.directory, name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self.size += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            if self.size > self.max_bytes or time.monotonic() - self._scanned > self.scan_interval:
+                # Other workers' files count against the same limit
+                self._scan()
+            evict = []
+            while self.size > self.max_bytes and len(self._files) > 1:
+                old, size = self._files.popitem(last=False)
+                self.size -= size
+                evict.append(old)
+            self.evictions += len(evict)
+        for old in evict:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except FileNotFoundError:
+                pass
+        if evict:
+            telemetry.image_cache_events.inc(len(evict), event="eviction")
+
+    def __len__(self):
+        return len(self._files)
+
+
+def make_master(data: bytes) -> bytes:
+    """Decodes a downloaded photo into an upright RGB JPEG at most the largest width."""
+    img = Image.open(io.BytesIO(data))
+    max_width = IMAGE_WIDTHS[-1]
+    img.draft("RGB", (max_width, max_width))
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, "white")
+        img = Image.alpha_composite(background, img)
+    img = img.convert("RGB")
+    if img.width > max_width:
+        img = img.resize((max_width, round(img.height * max_width / img.width)), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def render(master: bytes, width: int, fmt: str) -> bytes:
+    """master scaled down to width (never up) and encoded as fmt."""
+    img = Image.open(io.BytesIO(master))
+    img.draft("RGB", (width, width))
+    if img.width > width:
+        img = img.resize((width, round(img.height * width / img.width)), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    if fmt == "webp":
+        img.save(out, format="WEBP", quality=IMAGE_QUALITY, method=4)
+    else:
+        img.save(out, format="JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+_store = None
+_inflight = {}
+
+
+def store() -> DiskCache:
+    global _store
+    if _store is None:
+        _store = DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+    return _store
+
+
+async def _once(name: str, compute):
+    """Runs compute() once for concurrent requests of the same file (cf. cache.get_or_compute)."""
+    future = _inflight.get(name)
+    if future is None:
+        future = asyncio.ensure_future(compute())
+        _inflight[name] = future
+        future.add_done_callback(lambda f: _finish(name, f))
+    # A disconnecting client must not cancel the work other requests share
+    return await asyncio.shield(future)
+
+
+def _finish(name: str, future):
+    _inflight.pop(name, None)
+    if not future.cancelled():
+        future.exception()  # mark as retrieved even if every waiter went away
+
+
+async def _master(url: str) -> bytes:
+    name = _master_name(url)
+    master = await asyncio.to_thread(store().get, name)
+    if master is not None:
+        return master
+
+    async def fetch():
+        try:
+            data = await upstream.fetch_image(url, IMAGE_MAX_SOURCE_BYTES)
+            with telemetry.span("thumbnail"):
+                master = await asyncio.to_thread(make_master, data)
+        except Exception as e:
+            raise ImageError(f"could not load {url}: {e}") from e
+        await asyncio.to_thread(store().set, name, master)
+        return master
+
+    return await _once(name, fetch)
+
+
+async def thumbnail(url: str, width: int, fmt: str) -> bytes:
+    """The (width, fmt) variant of url, from the disk cache or rendered once."""
+    name = variant_name(url, width, fmt)
+    data = await asyncio.to_thread(store().get, name)
+    if data is not None:
+        telemetry.image_cache_events.inc(event="hit")
+        return data
+    telemetry.image_cache_events.inc(event="miss")
+
+    async def build():
+        master = await _master(url)
+        with telemetry.span("thumbnail"):
+            data = await asyncio.to_thread(render, master, width, fmt)
+        await asyncio.to_thread(store().set, name, data)
+        return data
+
+    return await _once(name, build)
@@ -0,0 +1,302 @@
+# backend/upstream.py
+"""Async clients for the upstream APIs (OpenAI and Google Custom Search) and image hosts.
+
+Both clients share long-lived, pooled keep-alive connections so a request never
+pays for a fresh TLS handshake. Every call has its own timeout and a bounded
+retry budget; idempotent image searches are additionally hedged.
+"""
+import os
+import time
+import random
+import socket
+import asyncio
+import ipaddress
+
+import httpx
+import openai
+from dotenv import load_dotenv
+
+import telemetry
+
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+SEARCH_ENGINE_ID = os.getenv("SEARCH_ENGINE_ID")
+
+# Tunables (seconds unless noted)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+GOOGLE_TIMEOUT = float(os.getenv("GOOGLE_TIMEOUT", "8"))
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", "10"))
+IMAGE_MAX_REDIRECTS = int(os.getenv("IMAGE_MAX_REDIRECTS", "5"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+# Fire a second, identical image search if the first hasn't answered by then
+GOOGLE_HEDGE_DELAY = float(os.getenv("GOOGLE_HEDGE_DELAY", "1.5"))
+
+# Per-process budgets; defaults are the entry API tiers. Calls wait rather than hit 429s.
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "200000"))
+GOOGLE_QPM = int(os.getenv("GOOGLE_QPM", "100"))
+# Rough completion size of an identification answer, reserved up front and reconciled after
+ESTIMATED_COMPLETION_TOKENS = 200
+
+# Point these at local stand-ins (see bench/) to run without network or API spend
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+GOOGLE_SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30)
+
+# OpenAI retries 429/5xx/connection errors itself with exponential backoff
+openai_client = openai.AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    timeout=OPENAI_TIMEOUT,
+    max_retries=UPSTREAM_RETRIES,
+    http_client=openai.DefaultAsyncHttpxClient(limits=POOL_LIMITS),
+)
+http_client = httpx.AsyncClient(limits=POOL_LIMITS, timeout=GOOGLE_TIMEOUT)
+
+
+class RateLimiter:
+    """Token bucket refilling `per_minute` units a minute, bursting to one minute's worth."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Waits until `amount` units are available and takes them (FIFO)."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.level < amount:
+                await asyncio.sleep((amount - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+
+    def available(self) -> float:
+        self._refill()
+        return self.level
+
+    def debit(self, amount: float):
+        """Corrects an earlier estimate; a negative level delays later callers."""
+        self._refill()
+        self.level -= amount
+
+
+openai_requests = RateLimiter(OPENAI_RPM)
+openai_tokens = RateLimiter(OPENAI_TPM)
+google_requests = RateLimiter(GOOGLE_QPM)
+
+
+def _estimate_tokens(system_prompt: str, user_content) -> int:
+    # ~4 characters per token; a low-detail image is a flat 85 tokens
+    prompt = len(system_prompt) // 4
+    if isinstance(user_content, str):
+        prompt += len(user_content) // 4
+    else:
+        prompt += 85 * len(user_content)
+    return prompt + ESTIMATED_COMPLETION_TOKENS
+
+
+async def _openai_budget(system_prompt: str, user_content) -> int:
+    estimate = _estimate_tokens(system_prompt, user_content)
+    await openai_requests.acquire()
+    await openai_tokens.acquire(estimate)
+    return estimate
+
+
+async def aclose():
+    """Closes the pooled connections. Called on app shutdown."""
+    await openai_client.close()
+    await http_client.aclose()
+
+
+def _backoff(attempt: int, retry_after: str | None = None) -> float:
+    """Exponential backoff with full jitter, honouring a short Retry-After."""
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), 10.0)
+    return random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+
+
+async def _get_json(url: str, params: dict, timeout: float, limiter: RateLimiter) -> dict:
+    """GET with a bounded number of retries on transient failures.
+
+    Every attempt (including retries and hedged copies) spends from limiter,
+    so the budget bounds real requests rather than logical calls.
+    """
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        last_attempt = attempt == UPSTREAM_RETRIES
+        await limiter.acquire()
+        try:
+            resp = await http_client.get(url, params=params, timeout=timeout)
+        except httpx.TransportError as e:
+            if last_attempt:
+                raise
+            telemetry.upstream_errors.inc(upstream="google", kind=f"retried_{telemetry._error_kind(e)}")
+            await asyncio.sleep(_backoff(attempt))
+            continue
+        if resp.status_code in RETRYABLE_STATUS and not last_attempt:
+            telemetry.upstream_errors.inc(upstream="google", kind=f"retried_{resp.status_code}")
+            await asyncio.sleep(_backoff(attempt, resp.headers.get("retry-after")))
+            continue
+        resp.raise_for_status()
+        return resp.json()
+
+
+async def _hedged(make_call, delay: float, limiter: RateLimiter | None = None):
+    """Runs make_call(); if it is still pending after `delay`, races a second copy.
+
+    The first successful result wins and the loser is cancelled. Only use this
+    for idempotent calls. No copy is started while limiter has no spare budget,
+    since it would only queue behind the first call.
+    """
+    first = asyncio.create_task(make_call())
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and (limiter is None or limiter.available() >= 1):
+            tasks.add(asyncio.create_task(make_call()))
+
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # Also covers the caller being cancelled, which asyncio.wait does not pass on
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # a losing copy's failure is not worth a warning
+
+
+async def chat_json(system_prompt: str, user_content, model: str = "gpt-4o-mini", temperature: float = 0.5):
+    """Runs a JSON-mode chat completion and returns the raw response."""
+    estimate = await _openai_budget(system_prompt, user_content)
+    with telemetry.upstream_call("openai"):
+        resp = await openai_client.chat.completions.create(
+            model=model,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            temperature=temperature,
+        )
+    telemetry.record_usage(model, resp.usage)
+    if resp.usage:
+        openai_tokens.debit(resp.usage.total_tokens - estimate)
+    return resp
+
+
+async def chat_json_stream(system_prompt: str, user_content, model: str = "gpt-4o-mini", temperature: float = 0.5):
+    """Like chat_json, but yields the content as it is generated."""
+    estimate = await _openai_budget(system_prompt, user_content)
+    # Latency here is time to first token; the rest is paced by generation
+    with telemetry.upstream_call("openai_stream"):
+        stream = await openai_client.chat.completions.create(
+            model=model,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content},
+            ],
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+    try:
+        async for chunk in stream:
+            if chunk.usage:
+                telemetry.record_usage(model, chunk.usage)
+                openai_tokens.debit(chunk.usage.total_tokens - estimate)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
+
+async def google_image_search(query: str, num: int = 4) -> list:
+    """Returns the raw `items` of a Google Custom Search image query."""
+    if not GOOGLE_API_KEY or not SEARCH_ENGINE_ID:
+        raise ValueError("Google API Key or Search Engine ID is missing.")
+
+    params = {
+        "key": GOOGLE_API_KEY,
+        "cx": SEARCH_ENGINE_ID,
+        "q": query,
+        "searchType": "image",
+        "num": num,
+        "imgSize": "LARGE",
+        "safe": "high",
+    }
+    with telemetry.upstream_call("google"):
+        res = await _hedged(
+            lambda: _get_json(GOOGLE_SEARCH_URL, params, GOOGLE_TIMEOUT, google_requests),
+            GOOGLE_HEDGE_DELAY,
+            limiter=google_requests,
+        )
+    return res.get("items", [])
+
+
+async def _resolve(host: str, port: int) -> list:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return [info[4][0] for info in infos]
+
+
+async def _check_public(url: httpx.URL):
+    """Raises ValueError unless url is http(s) on a host with only public addresses.
+
+    Listing photos come from arbitrary sites, so without this a link or a
+    redirect could make the image proxy fetch from the internal network.
+    """
+    if url.scheme not in ("http", "https") or not url.host:
+        raise ValueError(f"refusing to fetch {url}")
+    try:
+        addresses = [ipaddress.ip_address(url.host)]
+    except ValueError:
+        port = url.port or (443 if url.scheme == "https" else 80)
+        addresses = [ipaddress.ip_address(address) for address in await _resolve(url.host, port)]
+    for ip in addresses:
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        # is_global excludes private, loopback, link-local and reserved ranges
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"refusing to fetch {url}: {url.host} is not a public address")
+
+
+async def fetch_image(url: str, max_bytes: int) -> bytes:
+    """Downloads a listing photo from its host, refusing anything over max_bytes.
+
+    Redirects are followed by hand so every hop gets the _check_public check.
+    """
+    headers = {"Accept": "image/*", "User-Agent": "Mozilla/5.0 (compatible; ValueAI image proxy)"}
+    url = httpx.URL(url)
+    with telemetry.upstream_call("image_host"):
+        for _ in range(IMAGE_MAX_REDIRECTS + 1):
+            await _check_public(url)
+            async with http_client.stream("GET", url, headers=headers, timeout=IMAGE_TIMEOUT, follow_redirects=False) as resp:
+                if resp.is_redirect:
+                    url = url.join(resp.headers["location"])
+                    continue
+                resp.raise_for_status()
+                chunks, size = [], 0
+                async for chunk in resp.aiter_bytes():
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"image is larger than {max_bytes} bytes")
+                    chunks.append(chunk)
+            return b"".join(chunks)
+        raise ValueError(f"more than {IMAGE_MAX_REDIRECTS} redirects fetching {url}")
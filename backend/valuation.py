@@ -0,0 +1,184 @@
+# backend/valuation.py
+"""Local valuation engine: value ranges, price histories and listings from a
+depreciation-curve model, instead of asking the LLM to invent them.
+
+Each vehicle is priced from its segment's base price, decayed by age and by
+mileage relative to a typical 12,000 miles a year, with a small monthly
+seasonality. Everything is computed on NumPy arrays, so appraise_many() values
+thousands of vehicles in one pass. Output is deterministic for a given vehicle
+and day.
+"""
+import datetime
+import hashlib
+
+import numpy as np
+
+# segment: (base price new, yearly depreciation rate, extra early drop)
+SEGMENTS = {
+    "economy": (24000, 0.11, 0.10),
+    "mainstream": (34000, 0.10, 0.12),
+    "truck": (50000, 0.08, 0.08),
+    "luxury": (60000, 0.13, 0.18),
+    "ev": (52000, 0.15, 0.20),
+    "sports": (80000, 0.09, 0.12),
+    "exotic": (190000, 0.08, 0.15),
+    "hypercar": (450000, 0.03, 0.05),
+}
+
+MAKE_SEGMENTS = {
+    "acura": "luxury", "alfa romeo": "luxury", "aston martin": "exotic", "audi": "luxury",
+    "bentley": "exotic", "bmw": "luxury", "bugatti": "hypercar", "buick": "mainstream",
+    "cadillac": "luxury", "chevrolet": "mainstream", "chrysler": "mainstream", "dodge": "mainstream",
+    "ferrari": "exotic", "fiat": "economy", "ford": "mainstream", "genesis": "luxury",
+    "gmc": "truck", "honda": "mainstream", "hyundai": "economy", "infiniti": "luxury",
+    "jaguar": "luxury", "jeep": "mainstream", "kia": "economy", "koenigsegg": "hypercar",
+    "lamborghini": "exotic", "land rover": "luxury", "lexus": "luxury", "lincoln": "luxury",
+    "lotus": "sports", "lucid": "ev", "maserati": "luxury", "mazda": "mainstream",
+    "mclaren": "exotic", "mercedes-benz": "luxury", "mini": "economy", "mitsubishi": "economy",
+    "nissan": "economy", "pagani": "hypercar", "polestar": "ev", "porsche": "sports",
+    "ram": "truck", "rivian": "ev", "rolls-royce": "exotic", "subaru": "mainstream",
+    "tesla": "ev", "toyota": "mainstream", "volkswagen": "mainstream", "volvo": "luxury",
+}
+
+# Models priced well away from the rest of their make, matched by leading word:
+# "g" matches "G-Class" and "G550" but not "GLA" (see segment_for)
+MODEL_SEGMENTS = {
+    "audi": {"r8": "exotic", "rs": "sports", "e-tron": "ev"},
+    "bmw": {"m": "sports", "i": "ev", "ix": "ev"},
+    "chevrolet": {"corvette": "sports", "silverado": "truck", "colorado": "truck", "bolt": "ev"},
+    "dodge": {"viper": "sports"},
+    "ford": {"f-": "truck", "ranger": "truck", "mustang mach": "ev", "mustang": "sports", "gt": "exotic"},
+    "honda": {"ridgeline": "truck", "nsx": "exotic"},
+    "lexus": {"lfa": "hypercar"},
+    "mercedes-benz": {"amg gt": "sports", "eqa": "ev", "eqb": "ev", "eqe": "ev", "eqs": "ev", "g": "exotic"},
+    "nissan": {"gt-r": "sports", "titan": "truck", "frontier": "truck", "leaf": "ev"},
+    "porsche": {"918": "hypercar", "taycan": "ev"},
+    "toyota": {"tacoma": "truck", "tundra": "truck", "supra": "sports", "gr supra": "sports"},
+}
+
+SEGMENT_TRIMS = {
+    "economy": ("LX", "EX", "Sport", "Limited"),
+    "mainstream": ("Base", "Sport", "Touring", "Limited"),
+    "truck": ("Work Truck", "XLT", "Lariat", "Platinum"),
+    "luxury": ("Premium", "Premium Plus", "Sport", "Prestige"),
+    "ev": ("Standard Range", "Long Range", "Performance", "Dual Motor"),
+    "sports": ("Coupe", "Convertible", "Performance", "Track Edition"),
+    "exotic": ("Coupe", "Spyder", "Performance", "Launch Edition"),
+    "hypercar": ("Coupe", "Roadster", "Launch Edition", "Final Edition"),
+}
+
+MILES_PER_YEAR = 12000
+MILEAGE_RATE = 0.035  # value lost per 10,000 miles above typical
+# Used-car prices by calendar month (Jan..Dec): spring tax-refund peak, winter dip
+SEASONALITY = np.array([0.985, 0.995, 1.010, 1.020, 1.015, 1.010, 1.000, 0.995, 0.990, 0.990, 0.985, 0.980])
+MONTHS_AGO = np.array([12, 10, 8, 6, 4, 2, 0])
+LISTINGS_PER_VEHICLE = 4
+
+
+def segment_for(make: str, model: str) -> str:
+    make, model = str(make or "").strip().lower(), str(model or "").strip().lower()
+    for prefix, segment in MODEL_SEGMENTS.get(make, {}).items():
+        # The prefix must not run on into more letters: "m3" and "m 340i" but not "mirai"
+        if model.startswith(prefix) and not model[len(prefix):len(prefix) + 1].isalpha():
+            return segment
+    return MAKE_SEGMENTS.get(make, "mainstream")
+
+
+def _curve(base, rate, drop, age, miles):
+    """Value of a car `age` years old with `miles` on it (all arrays, broadcast)."""
+    age = np.maximum(age, 0.0)
+    value = base * np.exp(-rate * age) * (1 - drop * (1 - np.exp(-3 * age)))
+    excess = (miles - MILES_PER_YEAR * age) / 10000
+    value = value * np.clip(np.exp(-MILEAGE_RATE * excess), 0.6, 1.15)
+    return np.maximum(value, base * 0.08)
+
+
+def _model_year(value, current_year: int) -> int:
+    try:
+        return min(max(int(value), 1950), current_year + 1)
+    except (TypeError, ValueError):
+        return current_year
+
+
+def _money(value) -> str:
+    return f"${int(value):,}"
+
+
+def appraise_many(cars: list, mileages=None, today: datetime.date | None = None) -> list:
+    """Valuation fields for each car dict (make/model/year), in one array pass.
+
+    Returns dicts with "valueRange", "priceHistoryMonthly", "priceHistoryYearly"
+    and "listings", shaped like the /find-cars response. `mileages` is optional
+    (None or an entry of None means typical mileage for the car's age).
+    """
+    today = today or datetime.date.today()
+    n = len(cars)
+    if n == 0:
+        return []
+
+    years = np.array([_model_year(car.get("year"), today.year) for car in cars])
+    segments = [segment_for(car.get("make"), car.get("model")) for car in cars]
+    params = np.array([SEGMENTS[s] for s in segments], dtype=float)
+    base, rate, drop = params[:, 0:1], params[:, 1:2], params[:, 2:3]
+
+    # Age in years now; model years go on sale in the autumn before
+    age_now = (today.year - years) + (today.month + 3) / 12 - 1
+    age_now = np.maximum(age_now, 0.0)[:, None]
+    typical = MILES_PER_YEAR * age_now
+    miles = np.array([np.nan if m is None else m for m in (mileages or [None] * n)], dtype=float)[:, None]
+    miles = np.where(np.isnan(miles), typical, miles)
+
+    # Monthly history: same car, proportionally fewer miles, seasonal by month
+    ages = age_now - MONTHS_AGO / 12
+    past_miles = miles * np.where(age_now > 0, np.maximum(ages, 0) / np.maximum(age_now, 1e-9), 0)
+    season = SEASONALITY[(today.month - 1 - MONTHS_AGO) % 12]
+    monthly = np.round(_curve(base, rate, drop, ages, past_miles) * season / 100) * 100
+    current = monthly[:, -1:]
+
+    # Yearly history: model year up to this year (mid-year values), ending at current
+    span = max(int(today.year - years.min()) + 1, 1)
+    cal_years = years[:, None] + np.arange(span)
+    year_ages = cal_years - years[:, None] + 0.5
+    yearly = np.round(_curve(base, rate, drop, year_ages, MILES_PER_YEAR * year_ages) / 100) * 100
+    yearly = np.where(cal_years >= today.year, current, yearly)
+    year_counts = np.maximum(today.year - years + 1, 1)
+
+    # Listings: per-vehicle deterministic draws from a hash of the vehicle and day
+    seeds = b"".join(
+        hashlib.md5(f"{y}|{c.get('make')}|{c.get('model')}|{today}".lower().encode()).digest()
+        for y, c in zip(years.tolist(), cars)
+    )
+    draws = np.frombuffer(seeds, dtype=np.uint16).reshape(n, 8) / 65536.0
+    listing_miles = np.maximum(np.round(typical * (0.4 + 1.2 * draws[:, :4]) / 100) * 100, 50)
+    markup = 1.02 + 0.08 * draws[:, 4:]
+    listing_price = np.round(_curve(base, rate, drop, age_now, listing_miles) * markup / 100) * 100
+
+    low = np.round(current[:, 0] * 0.93 / 500) * 500
+    high = np.round(current[:, 0] * 1.07 / 500) * 500
+
+    results = []
+    for i, car in enumerate(cars):
+        name = f"{years[i]} {car.get('make')} {car.get('model')}"
+        trims = SEGMENT_TRIMS[segments[i]]
+        results.append({
+            "valueRange": f"{_money(low[i])} - {_money(high[i])}",
+            "priceHistoryMonthly": [
+                {"name": "current" if m == 0 else f"{m}m ago", "value": int(v)}
+                for m, v in zip(MONTHS_AGO.tolist(), monthly[i].tolist())
+            ],
+            "priceHistoryYearly": [
+                {"name": str(y), "value": int(v)}
+                for y, v in zip(cal_years[i, :year_counts[i]].tolist(), yearly[i, :year_counts[i]].tolist())
+            ],
+            "listings": [
+                {"id": j + 1, "title": f"{name} {trims[j]}", "price": _money(listing_price[i, j]),
+                 "mileage": f"{int(listing_miles[i, j]):,} miles"}
+                for j in range(LISTINGS_PER_VEHICLE)
+            ],
+        })
+    return results
+
+
+def appraise(car: dict, mileage: int | None = None) -> dict:
+    """Valuation fields for a single car dict; see appraise_many."""
+    return appraise_many([car], [mileage])[0]
@@ -0,0 +1,110 @@
+# backend/vision.py
+"""Photo identification for /upload: downscale, perceptual hash, GPT-4o vision."""
+import io
+import os
+import json
+import base64
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+import upstream
+import telemetry
+
+# GPT-4o's "low" detail mode looks at a single 512px tile, so anything larger
+# only costs upload bytes and base64 size without helping identification.
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", "512"))
+UPLOAD_JPEG_QUALITY = int(os.getenv("UPLOAD_JPEG_QUALITY", "80"))
+# Cap on the whole /upload request body, checked against Content-Length
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(15 * 1024 * 1024)))
+# Max differing bits (out of 64) for two photos to count as the same car
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+PHASH_MAX_ENTRIES = int(os.getenv("PHASH_MAX_ENTRIES", "2048"))
+
+IDENTIFY_PROMPT = """
+You are a car identification assistant.
+The user will provide a photo of a vehicle.
+You must reply with only a JSON object in this exact format:
+
+{
+  "make": "string",
+  "model": "string",
+  "year": 2022,
+  "description": "string"
+}
+
+"description" is two or three sentences about the car for a buyer.
+Give your best estimate of the model year. If there is no vehicle in the photo, reply with {"error": "string"}.
+""".strip()
+
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash: robust to re-encoding, resizing and small crops."""
+    small = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    px = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return bits
+
+
+def prepare_image(data: bytes) -> tuple[bytes, int]:
+    """Decodes an upload and returns (downscaled JPEG bytes, perceptual hash).
+
+    CPU-bound; run it off the event loop.
+    """
+    img = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder do most of the downscale during the DCT (much cheaper)
+    img.draft("RGB", (UPLOAD_MAX_SIDE, UPLOAD_MAX_SIDE))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    img.thumbnail((UPLOAD_MAX_SIDE, UPLOAD_MAX_SIDE), Image.Resampling.LANCZOS)
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=UPLOAD_JPEG_QUALITY, optimize=True)
+    return out.getvalue(), dhash(img)
+
+
+class PhashIndex:
+    """Recent identifications keyed by perceptual hash, with near-duplicate lookup."""
+
+    def __init__(self, max_entries: int = PHASH_MAX_ENTRIES, max_distance: int = PHASH_MAX_DISTANCE):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._data = OrderedDict()
+
+    def get(self, phash: int):
+        if phash in self._data:
+            self._data.move_to_end(phash)
+            return self._data[phash]
+        # A linear scan over a few thousand ints is microseconds
+        for known, car in self._data.items():
+            if (known ^ phash).bit_count() <= self.max_distance:
+                self._data.move_to_end(known)
+                return car
+        return None
+
+    def set(self, phash: int, car: dict):
+        self._data[phash] = car
+        self._data.move_to_end(phash)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+identified = PhashIndex()
+
+
+async def identify_image(jpeg: bytes) -> dict:
+    """Asks GPT-4o vision for the make, model and year of the car in the photo."""
+    data_url = "data:image/jpeg;base64," + base64.b64encode(jpeg).decode("ascii")
+    with telemetry.span("vision"):
+        chat_resp = await upstream.chat_json(
+            IDENTIFY_PROMPT,
+            [
+                {"type": "text", "text": "Identify this car."},
+                {"type": "image_url", "image_url": {"url": data_url, "detail": "low"}},
+            ],
+            model="gpt-4o",
+            temperature=0,
+        )
+    return json.loads(chat_resp.choices[0].message.content)
@@ -16,6 +16,7 @@ function App() {
   const [isSearchActive, setIsSearchActive] = useState(false);
   const [isInputFocused, setIsInputFocused] = useState(false);
   const [showAnimatedText, setShowAnimatedText] = useState(true);
+  const [suggestions, setSuggestions] = useState([]);
 
   const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
@@ -42,9 +43,31 @@ function App() {
     }
   }, [file]);
 
+  useEffect(() => {
+    const q = searchTerm.trim();
+    if (q.length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    // Debounced; the backend answers from its local catalog
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      fetch(`${API_URL}/autocomplete?q=${encodeURIComponent(q)}`, { signal: controller.signal })
+        .then(res => (res.ok ? res.json() : { suggestions: [] }))
+        .then(data => setSuggestions(data.suggestions))
+        .catch(() => {});
+    }, 80);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchTerm, API_URL]);
+
   // Handlers
   const handleAction = async () => {
-    if (searchTerm.trim()) {
+    if (file) {
+      await uploadImage();
+    } else if (searchTerm.trim()) {
       await findCars();
     }
   };
@@ -62,7 +85,7 @@ function App() {
     setCarData(null);
 
     try {
-      const res = await fetch(`${API_URL}/find-cars`, {
+      const res = await fetch(`${API_URL}/find-cars/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ searchTerm: searchTerm.trim() }),
@@ -71,11 +94,60 @@ function App() {
         const errorData = await res.json();
         throw new Error(errorData.detail || `Server error: ${res.status}`);
       }
+
+      // NDJSON: render each stage as soon as its line arrives
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split("\n");
+        buffered = lines.pop();
+        for (const line of lines) {
+          if (line.trim()) applyEvent(JSON.parse(line));
+        }
+      }
+    } catch (err) {
+      console.error(err);
+      setError(err.message || "Failed to fetch car info.");
+    } finally {
+      setIsEstimating(false);
+    }
+  };
+
+  const applyEvent = ({ type, ...fields }) => {
+    if (type === "error") throw new Error(fields.detail);
+    if (type === "listing") {
+      setCarData((prev) => ({ ...prev, listings: [...(prev?.listings || []), fields.listing] }));
+    } else {
+      setCarData((prev) => ({ ...prev, ...fields }));
+    }
+  };
+
+  const uploadImage = async () => {
+    if (!file) return;
+    setIsEstimating(true);
+    setError("");
+    setCarData(null);
+
+    try {
+      const formData = new FormData();
+      formData.append("image", file);
+      const res = await fetch(`${API_URL}/upload`, {
+        method: "POST",
+        body: formData,
+      });
+      if (!res.ok) {
+        const errorData = await res.json();
+        throw new Error(errorData.detail || `Server error: ${res.status}`);
+      }
       const data = await res.json();
       setCarData(data);
     } catch (err) {
       console.error(err);
-      setError(err.message || "Failed to fetch car info.");
+      setError(err.message || "Failed to identify the car.");
     } finally {
       setIsEstimating(false);
     }
@@ -150,6 +222,8 @@ function App() {
                   type="text"
                   placeholder="Enter Make, Model, and Year"
                   className="search-input"
+                  list="vehicle-suggestions"
+                  autoComplete="off"
                   value={searchTerm}
                   onChange={e => setSearchTerm(e.target.value)}
                   onFocus={() => setIsInputFocused(true)}
@@ -157,6 +231,9 @@ function App() {
                   onKeyDown={handleKeyDown}
                   disabled={!!file}
                 />
+                <datalist id="vehicle-suggestions">
+                  {suggestions.map(s => <option key={s.label} value={s.label} />)}
+                </datalist>
               </div>
             </div>
             <button
@@ -195,7 +272,7 @@ function App() {
                 )}
             </div>
             {carData.listings && carData.listings.length > 0 && (
-                <ForSaleListings listings={carData.listings} />
+                <ForSaleListings listings={carData.listings} apiUrl={API_URL} />
             )}
           </div>
         )}
@@ -2,7 +2,23 @@
 
 import React from 'react';
 
-function ForSaleListings({ listings }) {
+// Fixed widths the backend's /img proxy renders (thumbnails.IMAGE_WIDTHS)
+const IMAGE_WIDTHS = [320, 640, 1280];
+
+// Proxy URLs are relative to the API; anything else is used as is
+function imageSrc(apiUrl, url, width) {
+  if (!url || !url.startsWith('/img?')) return url;
+  const params = new URLSearchParams(url.slice('/img?'.length));
+  if (width) params.set('w', width);
+  return `${apiUrl}/img?${params}`;
+}
+
+function imageSrcSet(apiUrl, url) {
+  if (!url || !url.startsWith('/img?')) return undefined;
+  return IMAGE_WIDTHS.map(w => `${imageSrc(apiUrl, url, w)} ${w}w`).join(', ');
+}
+
+function ForSaleListings({ listings, apiUrl }) {
   if (!listings || listings.length === 0) {
     return null;
   }
@@ -19,7 +35,15 @@ function ForSaleListings({ listings }) {
             rel="noopener noreferrer"
             className="listing-card"
           >
-            <img src={listing.imageUrl} alt={listing.title} className="listing-image" />
+            <img
+              src={imageSrc(apiUrl, listing.imageUrl)}
+              srcSet={imageSrcSet(apiUrl, listing.imageUrl)}
+              sizes="(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 25vw"
+              loading="lazy"
+              decoding="async"
+              alt={listing.title}
+              className="listing-image"
+            />
             <div className="listing-info">
               <h4 className="listing-title">{listing.title}</h4>
               <p className="listing-price">{listing.price}</p>